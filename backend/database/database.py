@@ -1,22 +1,34 @@
-from supabase import create_client, Client
+import threading
 
 # Manages the Supabase client instance
+# The supabase package is only imported when the client is first used, so starting a worker does not pay for it.
 
-# Global variable to hold the Supabase client
+# Global variables to hold the Supabase settings and the client created from them
 supabase = None
+supabase_url = None
+supabase_key = None
+client_lock = threading.Lock()
 
 def init_database(app):
-    # Initialize the Supabase client with app configuration
+    # Store the Supabase settings from the app configuration, the client is created on first use
 
-    global supabase
+    global supabase, supabase_url, supabase_key
 
     # The app context is needed to access app.config
     with app.app_context():
-        supabase = create_client(
-            app.config['SUPABASE_URL'],
-            app.config['SUPABASE_KEY']
-        )
+        supabase_url = app.config['SUPABASE_URL']
+        supabase_key = app.config['SUPABASE_KEY']
+        supabase = None
 
 def get_supabase():
-    # returns the instance of the Supabase client
-    return supabase
\ No newline at end of file
+    # returns the instance of the Supabase client, creating it on the first call
+
+    global supabase
+
+    if supabase is None:
+        with client_lock:
+            if supabase is None:
+                from supabase import create_client
+                supabase = create_client(supabase_url, supabase_key)
+
+    return supabase
@@ -0,0 +1,345 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from loadtest.fake_services import create_nhtsa_app, create_supabase_app, start_server
+from loadtest.fixtures import build_fixture_model, fixture_model_path, EXTERIOR_COLORS, INTERIOR_COLORS, ZIP_CODES, FIXTURE_SUPABASE_KEY
+
+# Load test driver for the Flask backend.
+# Starts the fake NHTSA and Supabase servers, builds the fixture model, then for each server configuration
+# starts the app against them and replays user sessions (/api/vin-lookup -> /api/predict -> /api/results/<uuid>)
+# at a target request rate, reporting throughput, latency percentiles and the memory of the server processes.
+#
+# Run from the backend directory, for example:
+#   python -m loadtest.driver --rps 20 --duration 60 --configs flask gunicorn:2x1 gunicorn-preload:4x1
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Characters allowed in a VIN, matching validate_vin() in services/vin_services.py.
+VIN_CHARACTERS = 'ABCDEFGHJKLMNPRSTUVWXYZ0123456789'
+
+# Requests per session, used to turn the target request rate into a session start rate.
+REQUESTS_PER_SESSION = 3
+
+def random_vin(rng):
+    return ''.join(rng.choice(VIN_CHARACTERS) for _ in range(17))
+
+# Builds the /api/predict payload the same way frontend/src/forms/VehicleQuestionnaireForm.tsx does.
+def build_predict_payload(vehicle_data, vin, rng):
+    year = vehicle_data.get('year')
+    exterior_color = rng.choice(EXTERIOR_COLORS)
+    interior_color = rng.choice(INTERIOR_COLORS)
+    mileage = int(max(0, (time.localtime().tm_year - (year or 2018)) * rng.gauss(12000, 4000)))
+
+    return {
+        'year': year,
+        'make_name': (vehicle_data.get('make_name') or 'unknown').lower(),
+        'model_name': (vehicle_data.get('model_name') or 'unknown').lower(),
+        'trim_name': (vehicle_data.get('trim') or 'unknown').lower(),
+        'body_type': (vehicle_data.get('body_type') or 'unknown').lower(),
+        'engine_type': (vehicle_data.get('engine_type') or 'unknown').lower(),
+        'fuel_type': (vehicle_data.get('fuel_type') or 'unknown').lower(),
+        'horsepower': vehicle_data.get('horsepower'),
+        'transmission': (vehicle_data.get('transmission') or 'unknown').lower(),
+        'wheel_system_display': (vehicle_data.get('wheel_system_display') or 'unknown').lower(),
+        'torque': None,
+        'city_fuel_economy': None,
+        'highway_fuel_economy': None,
+        'combine_fuel_economy': None,
+        'mileage': mileage,
+        'dealer_zip': rng.choice(ZIP_CODES),
+        'exterior_color': exterior_color,
+        'interior_color': interior_color,
+        'exterior_color_base': exterior_color,
+        'interior_color_base': interior_color,
+        'owner_count': rng.choice([1, 2]),
+        'frame_damaged': 'FALSE',
+        'has_accidents': 'TRUE' if rng.random() < 0.2 else 'FALSE',
+        'salvage': 'FALSE',
+        'theft_title': 'FALSE',
+        'is_new': 'TRUE' if year == time.localtime().tm_year else 'FALSE',
+        'daysonmarket': 30,
+        'vin': vin
+    }
+
+class SessionRecorder:
+    # Collects (endpoint, latency, ok) samples from concurrent sessions.
+    def __init__(self):
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def timed(self, http, endpoint, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = http.request(method, url, timeout=60, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response = None
+            ok = False
+        latency = time.perf_counter() - start
+
+        with self.lock:
+            self.samples.append((endpoint, latency, ok))
+        return response if ok else None
+
+# Replays one user session, stopping at the first failed step.
+def run_session(base_url, recorder, rng, think_time):
+    vin = random_vin(rng)
+    with requests.Session() as http:
+        response = recorder.timed(http, 'vin-lookup', 'POST', f'{base_url}/api/vin-lookup', json={'vin': vin})
+        if response is None:
+            return
+
+        time.sleep(think_time)
+        payload = build_predict_payload(response.json()['data'], vin, rng)
+        response = recorder.timed(http, 'predict', 'POST', f'{base_url}/api/predict', json=payload)
+        if response is None:
+            return
+
+        time.sleep(think_time)
+        prediction_id = response.json()['prediction_id']
+        recorder.timed(http, 'results', 'GET', f'{base_url}/api/results/{prediction_id}')
+
+# Starts sessions on an open-loop schedule so slow responses do not lower the offered load.
+def replay(base_url, rps, duration, think_time, max_sessions, seed):
+    recorder = SessionRecorder()
+    session_rate = rps / REQUESTS_PER_SESSION
+    total_sessions = int(session_rate * duration)
+    rng = random.Random(seed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_sessions) as executor:
+        for i in range(total_sessions):
+            delay = start + i / session_rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(run_session, base_url, recorder, random.Random(rng.random()), think_time)
+    elapsed = time.perf_counter() - start
+
+    return recorder.samples, elapsed
+
+# Resident memory in bytes of a process and all its descendants, keyed by pid. Linux only, empty elsewhere.
+def process_tree_rss(root_pid):
+    if not os.path.isdir('/proc'):
+        return {}
+
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name can contain spaces, so fields are read after its closing parenthesis.
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    rss = {}
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss[pid] = int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+        pending.extend(children.get(pid, []))
+
+    return rss
+
+class MemorySampler:
+    # Samples the memory of a server process tree on a background thread and keeps the peaks.
+    def __init__(self, root_pid, interval=0.5):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak_total = 0
+        self.peak_process = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            rss = process_tree_rss(self.root_pid)
+            if rss:
+                self.peak_total = max(self.peak_total, sum(rss.values()))
+                self.peak_process = max(self.peak_process, max(rss.values()))
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# Builds the command for a server configuration:
+#   flask                   the Flask development server started by app.py (threaded)
+#   gunicorn:WxT            gunicorn with W worker processes and T threads per worker
+#   gunicorn-preload:WxT    the same, loading the app and model once before forking the workers
+def server_command(config, port):
+    if config == 'flask':
+        return [sys.executable, 'app.py']
+
+    name, _, size = config.partition(':')
+    if name not in ('gunicorn', 'gunicorn-preload'):
+        raise ValueError(f'Unknown server configuration {config}')
+    if shutil.which('gunicorn') is None:
+        raise ValueError('gunicorn is not installed')
+
+    workers, _, threads = (size or '1x1').partition('x')
+    command = [
+        'gunicorn',
+        '--workers', workers,
+        '--threads', threads or '1',
+        '--bind', f'127.0.0.1:{port}',
+        '--timeout', '120',
+    ]
+    if name == 'gunicorn-preload':
+        command.append('--preload')
+    return command + ['app:app']
+
+# Waits until the app answers, using a VIN lookup without a body which is rejected before any upstream call.
+def wait_until_ready(base_url, process, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode}')
+        try:
+            requests.post(f'{base_url}/api/vin-lookup', json={}, timeout=5)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError('Server did not start in time')
+
+def percentiles(latencies):
+    if not latencies:
+        return {'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+def summarize(config, samples, elapsed, memory):
+    report = {
+        'config': config,
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'throughput': sum(1 for _, _, ok in samples if ok) / elapsed if elapsed else 0.0,
+        'latency_ms': {'all': percentiles([latency for _, latency, _ in samples])},
+        'peak_rss_mb': memory.peak_total / 2**20,
+        'peak_process_rss_mb': memory.peak_process / 2**20
+    }
+    for endpoint in ('vin-lookup', 'predict', 'results'):
+        report['latency_ms'][endpoint] = percentiles([latency for name, latency, _ in samples if name == endpoint])
+    return report
+
+def run_config(config, args, env):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    process = subprocess.Popen(
+        server_command(config, port),
+        cwd=BACKEND_DIR,
+        env={**env, 'PORT': str(port)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL if not args.server_logs else None,
+        start_new_session=True
+    )
+
+    try:
+        wait_until_ready(base_url, process)
+        # Warm up every worker before measuring.
+        replay(base_url, args.rps, args.warmup, 0, args.max_sessions, args.seed + 1)
+
+        with MemorySampler(process.pid) as memory:
+            samples, elapsed = replay(base_url, args.rps, args.duration, args.think_time, args.max_sessions, args.seed)
+        return summarize(config, samples, elapsed, memory)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+def format_report(report):
+    lines = [
+        f"{report['config']}: {report['requests']} requests, {report['errors']} errors, "
+        f"{report['throughput']:.1f} req/s, peak RSS {report['peak_rss_mb']:.0f} MB "
+        f"(largest process {report['peak_process_rss_mb']:.0f} MB)"
+    ]
+    for endpoint, latency in report['latency_ms'].items():
+        if latency['p50'] is not None:
+            lines.append(
+                f"  {endpoint:<11} p50 {latency['p50']:8.1f} ms  p95 {latency['p95']:8.1f} ms  p99 {latency['p99']:8.1f} ms"
+            )
+    return '\n'.join(lines)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the backend against local fake NHTSA and Supabase servers.')
+    parser.add_argument('--configs', nargs='+', default=['flask', 'gunicorn:2x1', 'gunicorn:4x1'],
+                        help='server configurations: flask, gunicorn:WxT or gunicorn-preload:WxT')
+    parser.add_argument('--rps', type=float, default=10, help='target requests per second')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds per configuration')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured warm-up seconds per configuration')
+    parser.add_argument('--think-time', type=float, default=0, help='seconds between the steps of a session')
+    parser.add_argument('--max-sessions', type=int, default=256, help='maximum concurrent sessions')
+    parser.add_argument('--nhtsa-latency', type=float, default=0.15)
+    parser.add_argument('--nhtsa-error-rate', type=float, default=0.0)
+    parser.add_argument('--supabase-latency', type=float, default=0.03)
+    parser.add_argument('--supabase-error-rate', type=float, default=0.0)
+    parser.add_argument('--model-path', default=fixture_model_path(),
+                        help='model served by the app, the fixture model is built here if the file does not exist. '
+                             'The default path changes with the code the fixture is built from')
+    parser.add_argument('--output', help='write the reports as JSON to this file')
+    parser.add_argument('--server-logs', action='store_true', help='show the app server output')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    build_fixture_model(args.model_path)
+
+    nhtsa = start_server(create_nhtsa_app(args.nhtsa_latency, args.nhtsa_latency / 3, args.nhtsa_error_rate))
+    supabase = start_server(create_supabase_app(args.supabase_latency, args.supabase_latency / 3, args.supabase_error_rate))
+
+    env = {
+        **os.environ,
+        'FLASK_ENV': 'production',
+        'DEBUG': 'False',
+        'MODEL_PATH': os.path.abspath(args.model_path),
+        'NHTSA_API_URL': f'http://127.0.0.1:{nhtsa.server_port}/api',
+        'SUPABASE_URL': f'http://127.0.0.1:{supabase.server_port}',
+        'SUPABASE_KEY': FIXTURE_SUPABASE_KEY,
+    }
+
+    reports = []
+    try:
+        for config in args.configs:
+            report = run_config(config, args, env)
+            reports.append(report)
+            print(format_report(report), flush=True)
+    finally:
+        nhtsa.shutdown()
+        supabase.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import random
+import threading
+import time
+import uuid
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server, WSGIRequestHandler
+from loadtest.fixtures import vehicle_for_vin
+
+# Local stand-ins for the external services the backend calls, so the app can be load tested without
+# hitting vpic.nhtsa.dot.gov or the real Supabase project.
+# Both servers add a configurable latency (mean plus uniform jitter) and fail a configurable fraction of requests.
+
+def _inject_faults(latency, jitter, error_rate):
+    # Sleeps for the simulated upstream latency and returns True if this request should fail.
+    delay = latency + random.uniform(-jitter, jitter)
+    if delay > 0:
+        time.sleep(delay)
+    return random.random() < error_rate
+
+# Fake NHTSA vPIC API serving /api/vehicles/DecodeVin/<vin>?format=json.
+# VINs decode deterministically to one of the fixture vehicles in loadtest/fixtures.py.
+def create_nhtsa_app(latency=0.15, jitter=0.05, error_rate=0.0):
+    app = Flask('fake_nhtsa')
+
+    @app.route('/api/vehicles/DecodeVin/<vin>', methods=['GET'])
+    def decode_vin(vin):
+        if _inject_faults(latency, jitter, error_rate):
+            return jsonify({
+                'Message': 'Service Unavailable'
+            }), 503
+
+        vehicle, year = vehicle_for_vin(vin)
+        values = {
+            'Make': vehicle['make_name'].upper(),
+            'Model': vehicle['model_name'].title(),
+            'Trim': vehicle['trim_name'].upper(),
+            'Model Year': str(year),
+            'Engine Brake (hp) From': str(vehicle['horsepower']),
+            **vehicle['nhtsa']
+        }
+
+        results = [
+            {'Value': value, 'ValueId': '', 'Variable': variable, 'VariableId': i}
+            for i, (variable, value) in enumerate(values.items(), start=1)
+        ]
+
+        return jsonify({
+            'Count': len(results),
+            'Message': 'Results returned successfully',
+            'SearchCriteria': f'VIN:{vin}',
+            'Results': results
+        }), 200
+
+    return app
+
+# Fake Supabase project implementing the subset of the PostgREST API used by database/predictions.py:
+# inserting rows with POST /rest/v1/<table> and selecting with GET /rest/v1/<table>?<column>=eq.<value>.
+# Rows are kept in memory and every inserted row gets a UUID 'id', like the predictions table.
+def create_supabase_app(latency=0.03, jitter=0.01, error_rate=0.0):
+    app = Flask('fake_supabase')
+    tables = {}
+    lock = threading.Lock()
+
+    def postgrest_error(message, status):
+        return jsonify({
+            'code': 'PGRST000',
+            'details': None,
+            'hint': None,
+            'message': message
+        }), status
+
+    @app.route('/rest/v1/<table>', methods=['POST'])
+    def insert_rows(table):
+        if _inject_faults(latency, jitter, error_rate):
+            return postgrest_error('Simulated upstream error', 503)
+
+        payload = request.get_json(silent=True)
+        if payload is None:
+            return postgrest_error('Invalid JSON body', 400)
+
+        rows = payload if isinstance(payload, list) else [payload]
+        inserted = [{'id': str(uuid.uuid4()), **row} for row in rows]
+        with lock:
+            table_rows = tables.setdefault(table, {})
+            for row in inserted:
+                table_rows[row['id']] = row
+
+        # Rows are only returned when the client asks for them, as PostgREST does.
+        if 'return=representation' in request.headers.get('Prefer', ''):
+            return jsonify(inserted), 201
+        return '', 201
+
+    @app.route('/rest/v1/<table>', methods=['GET'])
+    def select_rows(table):
+        if _inject_faults(latency, jitter, error_rate):
+            return postgrest_error('Simulated upstream error', 503)
+
+        with lock:
+            rows = list(tables.get(table, {}).values())
+
+        # Horizontal filters in the form column=eq.value, other operators are not needed by the backend.
+        for column, condition in request.args.items():
+            if column in ('select', 'limit', 'offset', 'order'):
+                continue
+            operator, _, value = condition.partition('.')
+            if operator != 'eq':
+                return postgrest_error(f'Unsupported operator {operator}', 400)
+            rows = [row for row in rows if str(row.get(column)) == value]
+
+        return jsonify(rows), 200
+
+    return app
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # Skips the per-request access log, which would otherwise flood the load test output.
+    def log_request(self, *args, **kwargs):
+        pass
+
+# Runs a Flask app on a background thread with a threaded WSGI server, returning the server so it can be shut down.
+def start_server(app, host='127.0.0.1', port=0):
+    server = make_server(host, port, app, threaded=True, request_handler=QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,156 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from models.predictor import VehiclePredictor
+from models.train import train_predictor
+from services import normalizer
+from services.normalizer import normalize_body_type, normalize_drive_type, normalize_engine_type, normalize_transmission
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fixture data shared by the fake NHTSA server, the fixture model and the load test driver.
+# Each vehicle has the raw values NHTSA returns for it, and the fixture model is trained on the same values
+# passed through services/normalizer.py, so decoded VINs produce payloads with categories the model has seen.
+VEHICLES = [
+    {
+        'make_name': 'toyota', 'model_name': 'camry', 'trim_name': 'le', 'years': (2012, 2022), 'horsepower': 203,
+        'nhtsa': {'Body Class': 'Sedan/Saloon', 'Engine Number of Cylinders': '4', 'Engine Configuration': 'In-Line',
+                  'Drive Type': 'FWD/Front-Wheel Drive', 'Transmission Style': 'Automatic', 'Fuel Type - Primary': 'Gasoline'},
+    },
+    {
+        'make_name': 'honda', 'model_name': 'civic', 'trim_name': 'ex', 'years': (2012, 2022), 'horsepower': 158,
+        'nhtsa': {'Body Class': 'Hatchback/Liftback/Notchback', 'Engine Number of Cylinders': '4', 'Engine Configuration': 'In-Line',
+                  'Drive Type': 'FWD/Front-Wheel Drive', 'Transmission Style': 'Continuously Variable Transmission (CVT)',
+                  'Fuel Type - Primary': 'Gasoline'},
+    },
+    {
+        'make_name': 'ford', 'model_name': 'f-150', 'trim_name': 'xlt', 'years': (2010, 2022), 'horsepower': 375,
+        'nhtsa': {'Body Class': 'Pickup', 'Engine Number of Cylinders': '6', 'Engine Configuration': 'V-Shaped',
+                  'Drive Type': '4WD/4-Wheel Drive/4x4', 'Transmission Style': 'Automatic', 'Fuel Type - Primary': 'Gasoline'},
+    },
+    {
+        'make_name': 'chevrolet', 'model_name': 'equinox', 'trim_name': 'lt', 'years': (2012, 2022), 'horsepower': 170,
+        'nhtsa': {'Body Class': 'Sport Utility Vehicle (SUV)/Multi-Purpose Vehicle (MPV)', 'Engine Number of Cylinders': '4',
+                  'Engine Configuration': 'In-Line', 'Drive Type': 'AWD/All-Wheel Drive', 'Transmission Style': 'Automatic',
+                  'Fuel Type - Primary': 'Gasoline'},
+    },
+    {
+        'make_name': 'bmw', 'model_name': '3 series', 'trim_name': '330i', 'years': (2014, 2022), 'horsepower': 255,
+        'nhtsa': {'Body Class': 'Sedan/Saloon', 'Engine Number of Cylinders': '4', 'Engine Configuration': 'In-Line',
+                  'Drive Type': 'RWD/Rear-Wheel Drive', 'Transmission Style': 'Automatic', 'Fuel Type - Primary': 'Gasoline'},
+    },
+]
+
+# Detailed colors offered by the driver, all present in data/color_mappings.json.
+EXTERIOR_COLORS = ['black', 'bright white', 'race red', 'crystal black pearl', 'glacier white pearl', 'billet silver']
+INTERIOR_COLORS = ['black', 'gray']
+ZIP_CODES = ['10001', '30301', '60601', '75201', '94105', '98101']
+
+# Placeholder Supabase project settings for the fake PostgREST server.
+FIXTURE_SUPABASE_KEY = 'loadtest-anon-key'
+
+# Picks the fixture vehicle and model year a VIN decodes to. The same VIN always decodes to the same vehicle.
+def vehicle_for_vin(vin):
+    seed = sum(ord(char) * (i + 1) for i, char in enumerate(vin))
+    vehicle = VEHICLES[seed % len(VEHICLES)]
+    first_year, last_year = vehicle['years']
+    year = first_year + seed % (last_year - first_year + 1)
+    return vehicle, year
+
+# Model values of a fixture vehicle, normalized from its NHTSA values the same way extract_vehicle_data() does.
+def model_fields(vehicle):
+    nhtsa = vehicle['nhtsa']
+    return {
+        'body_type': normalize_body_type(nhtsa['Body Class']),
+        'engine_type': normalize_engine_type(nhtsa['Engine Number of Cylinders'], nhtsa['Engine Configuration']),
+        'wheel_system_display': normalize_drive_type(nhtsa['Drive Type']),
+        'transmission': normalize_transmission(nhtsa['Transmission Style']),
+        'fuel_type': nhtsa['Fuel Type - Primary'].lower(),
+    }
+
+# Generates synthetic listings in the same format as the cleaned training data.
+def make_fixture_data(rows=5000, seed=42):
+    rng = np.random.default_rng(seed)
+    records = []
+
+    for _ in range(rows):
+        vehicle = VEHICLES[rng.integers(len(VEHICLES))]
+        first_year, last_year = vehicle['years']
+        year = int(rng.integers(first_year, last_year + 1))
+        listed_year = int(rng.integers(max(year, 2018), 2023))
+        age = listed_year - year
+        mileage = max(0.0, age * rng.normal(12000, 4000))
+        has_accidents = rng.random() < 0.2
+        owner_count = int(rng.integers(1, 4))
+        exterior_color = rng.choice(EXTERIOR_COLORS)
+        interior_color = rng.choice(INTERIOR_COLORS)
+
+        price = (
+            vehicle['horsepower'] * 120 * (0.87 ** age)
+            - mileage * 0.04
+            - (2500 if has_accidents else 0)
+            - 500 * (owner_count - 1)
+            + rng.normal(0, 1200)
+        )
+
+        records.append({
+            'year': year,
+            'mileage': mileage,
+            'horsepower': vehicle['horsepower'],
+            'torque': np.nan,
+            'city_fuel_economy': np.nan,
+            'highway_fuel_economy': np.nan,
+            'combine_fuel_economy': np.nan,
+            'owner_count': owner_count,
+            'daysonmarket': int(rng.integers(1, 120)),
+            'listed_date': f'{rng.integers(1, 13)}/{rng.integers(1, 29)}/{listed_year}',
+            'make_name': vehicle['make_name'],
+            'model_name': vehicle['model_name'],
+            'trim_name': vehicle['trim_name'],
+            'exterior_color': exterior_color,
+            'interior_color': interior_color,
+            # Base colors are derived from the detailed colors by prepare_features()
+            'exterior_color_base': exterior_color,
+            'interior_color_base': interior_color,
+            'dealer_zip': rng.choice(ZIP_CODES),
+            'frame_damaged': 'FALSE',
+            'has_accidents': 'TRUE' if has_accidents else 'FALSE',
+            'is_new': 'TRUE' if age == 0 else 'FALSE',
+            'salvage': 'FALSE',
+            'theft_title': 'FALSE',
+            'price': max(price, 1000.0),
+            **model_fields(vehicle),
+        })
+
+    return pd.DataFrame(records)
+
+# Source files the fixture model depends on: the synthetic data, feature preparation, normalization, training and color maps.
+# The default model path includes a hash of them, so a fixture built before any of them changed is not reused.
+FIXTURE_SOURCES = [
+    os.path.abspath(__file__),
+    os.path.join(BACKEND_DIR, 'models', 'predictor.py'),
+    os.path.join(BACKEND_DIR, 'models', 'train.py'),
+    os.path.join(BACKEND_DIR, 'services', 'normalizer.py'),
+    normalizer.COLOR_MAPPINGS_PATH,
+]
+
+# Default path of the fixture model, in the temporary directory and versioned on the sources it is built from.
+def fixture_model_path():
+    digest = hashlib.sha256()
+    for filepath in FIXTURE_SOURCES:
+        if os.path.exists(filepath):
+            with open(filepath, 'rb') as f:
+                digest.update(f.read())
+    return os.path.join(tempfile.gettempdir(), f'vehicle_predictor_fixture-{digest.hexdigest()[:12]}.pkl')
+
+# Trains and saves a small VehiclePredictor on synthetic data, reusing an existing file at the same path.
+def build_fixture_model(filepath, rows=5000):
+    if os.path.exists(filepath):
+        return filepath
+
+    predictor = VehiclePredictor()
+    train_predictor(predictor, make_fixture_data(rows))
+    predictor.save(filepath)
+    return filepath
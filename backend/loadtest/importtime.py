@@ -0,0 +1,159 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from loadtest.fixtures import build_fixture_model, fixture_model_path, FIXTURE_SUPABASE_KEY
+
+# Import time check for the backend.
+# Runs each startup scenario in a fresh interpreter with python -X importtime, reports the total import time,
+# the packages that took longest and the peak memory (Linux only), and fails if a scenario imports a module it should not need:
+# pandas, scikit-learn or the database and Hugging Face clients on the /api/vin-lookup path,
+# or the training code (models/train.py) when the app starts serving a model.
+#
+# Run from the backend directory, for example:
+#   python -m loadtest.importtime
+#   python -m loadtest.importtime --max-ms app=500 app-with-model=4000
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that only the model or the external services need, none of which should be imported before first use.
+SERVICE_MODULES = ['pandas', 'sklearn', 'scipy', 'supabase', 'huggingface_hub']
+
+# Startup scenarios: the code run in the fresh interpreter, extra environment variables and the forbidden modules.
+# In 'app' the model is loaded in the background from a path that does not exist, so the loader fails before
+# importing the model code and only the imports of the app itself are measured.
+SCENARIOS = {
+    'vin-lookup': {
+        'code': 'import routes.vin, database.predictions',
+        'env': {},
+        'forbidden': SERVICE_MODULES
+    },
+    'app': {
+        'code': 'import app',
+        'env': {'MODEL_BACKGROUND_LOAD': 'true', 'MODEL_PATH': os.path.join(tempfile.gettempdir(), 'missing-model.pkl')},
+        'forbidden': SERVICE_MODULES
+    },
+    'app-with-model': {
+        'code': 'import app',
+        'env': {},
+        'forbidden': ['models.train', 'supabase', 'huggingface_hub']
+    }
+}
+
+# Appended to each scenario to print its peak memory on its own line in a single write, so it is not interleaved with
+# output of the app's threads. VmHWM is used as ru_maxrss would include the memory of this process before the fork.
+PEAK_RSS_CODE = '''
+import sys
+for line in open('/proc/self/status'):
+    if line.startswith('VmHWM'):
+        sys.stdout.write(f'\\npeak_rss_kb {line.split()[1]}\\n')
+'''
+
+# Parses the -X importtime report into (module, self microseconds, cumulative microseconds, depth) entries.
+def parse_importtime(stderr):
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+def peak_rss_kb(stdout):
+    for line in stdout.splitlines():
+        if line.startswith('peak_rss_kb '):
+            return int(line.split()[1])
+    return 0
+
+def run_scenario(name, scenario, env):
+    code = scenario['code'] + '\n' + PEAK_RSS_CODE
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BACKEND_DIR,
+        env={**env, **scenario['env']},
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Scenario {name} failed:\n{result.stderr[-2000:]}')
+
+    entries = parse_importtime(result.stderr)
+    modules = {module for module, _, _, _ in entries}
+
+    # Self time summed per top-level package, e.g. everything under sklearn counts towards sklearn.
+    packages = defaultdict(int)
+    for module, self_us, _, _ in entries:
+        packages[module.split('.')[0]] += self_us
+
+    return {
+        'scenario': name,
+        'total_ms': sum(cumulative_us for _, _, cumulative_us, depth in entries if depth == 0) / 1000,
+        'packages_ms': {package: us / 1000 for package, us in packages.items()},
+        'peak_rss_mb': peak_rss_kb(result.stdout) / 1024,
+        'forbidden': sorted(
+            module for module in scenario['forbidden']
+            if module in modules
+        )
+    }
+
+def format_report(report, top=8):
+    lines = [f"{report['scenario']}: {report['total_ms']:.0f} ms of imports, peak RSS {report['peak_rss_mb']:.0f} MB"]
+    slowest = sorted(report['packages_ms'].items(), key=lambda item: item[1], reverse=True)[:top]
+    for package, ms in slowest:
+        lines.append(f'  {package:<20} {ms:8.1f} ms')
+    if report['forbidden']:
+        lines.append(f"  imports modules it should not need: {', '.join(report['forbidden'])}")
+    return '\n'.join(lines)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Check what the backend imports at startup and how long it takes.')
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--max-ms', nargs='+', default=[], metavar='SCENARIO=MS',
+                        help='fail when the total import time of a scenario exceeds this many milliseconds')
+    parser.add_argument('--model-path', default=fixture_model_path(),
+                        help='model loaded by app-with-model, the fixture model is built here if the file does not exist. '
+                             'The default path changes with the code the fixture is built from')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    budgets = {}
+    for budget in args.max_ms:
+        name, _, ms = budget.partition('=')
+        budgets[name] = float(ms)
+
+    if 'app-with-model' in args.scenarios:
+        build_fixture_model(args.model_path)
+
+    # The Supabase settings are never contacted, as the client is only created when the first prediction is stored.
+    env = {
+        **os.environ,
+        'FLASK_ENV': 'production',
+        'DEBUG': 'False',
+        'MODEL_PATH': os.path.abspath(args.model_path),
+        'MODEL_POLL_INTERVAL': '0',
+        'SUPABASE_URL': 'http://127.0.0.1:1',
+        'SUPABASE_KEY': FIXTURE_SUPABASE_KEY,
+    }
+    env.pop('MODEL_DIR', None)
+    env.pop('MODEL_BACKGROUND_LOAD', None)
+    env.pop('CURVES_PATH', None)
+
+    failed = False
+    for name in args.scenarios:
+        report = run_scenario(name, SCENARIOS[name], env)
+        print(format_report(report), flush=True)
+
+        if report['forbidden']:
+            failed = True
+        if name in budgets and report['total_ms'] > budgets[name]:
+            print(f"  over the budget of {budgets[name]:.0f} ms")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,442 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# DepreciationCurves stores precomputed model predictions for popular vehicles over a grid of mileage and listing years.
+# Most traffic is for a few thousand common vehicles, so the /api/predict route can answer those requests
+# with a table lookup and interpolation, and fall back to the live model for everything else.
+#
+# Curves are keyed on the vehicle as decoded from its VIN. The inputs users choose in the questionnaire are covered by
+# the table instead of being part of the key: owner count and accident history are grid axes next to mileage and
+# listing year, and the exterior color, interior color and zip prefix are applied as per-vehicle adjustments measured
+# against the reference color and zip the curves were scored with. The remaining inputs are fixed to the values the
+# frontend sends (frontend/src/forms/VehicleQuestionnaireForm.tsx), and requests with other values use the live model.
+# The lookup reads the raw request payload, so answering from the table does not prepare or encode any features.
+
+# Fields that identify a vehicle, all decoded from the VIN. A curve is only used when all of these match the request.
+VEHICLE_COLUMNS = [
+    'year',
+    'make_name',
+    'model_name',
+    'trim_name',
+    'body_type',
+    'engine_type',
+    'fuel_type',
+    'horsepower',
+    'transmission',
+    'wheel_system_display',
+]
+
+# Columns used to rank the most popular vehicles in the source data.
+COMBINATION_COLUMNS = ['make_name', 'model_name', 'trim_name', 'year']
+
+# Inputs the frontend always sends with the same value, the curves are built with these values.
+FIXED_INPUTS = {
+    'torque': None,
+    'city_fuel_economy': None,
+    'highway_fuel_economy': None,
+    'combine_fuel_economy': None,
+    'daysonmarket': 30,
+}
+
+# Condition flags the curves are built without, requests with any of them set use the live model.
+FIXED_FLAGS = ['frame_damaged', 'salvage', 'theft_title']
+
+# Grid axes for the questionnaire inputs with only a few values.
+OWNER_COUNTS = [1, 2]
+ACCIDENT_FLAGS = ['FALSE', 'TRUE']
+
+# Annual mileage of the reference scenario the color and zip adjustments are measured at.
+REFERENCE_ANNUAL_MILEAGE = 12000
+
+# Normalizes a raw input value for comparison, matching how prepare_features() treats it:
+# missing values are equal to each other and numbers compare by value whatever their type.
+def _value(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+# The TRUE/FALSE flags are mapped to 1 when 'TRUE' and to 0 for any other value, as in prepare_features().
+def _flag(value):
+    return value == 'TRUE'
+
+# Zip prefix of a raw dealer_zip value, derived the same way prepare_features() does.
+def _zip_prefix(value):
+    if _value(value) is None:
+        value = '00000'
+    return str(value).replace('.0', '')[:3]
+
+# Key of the vehicle described by a request payload or a profile record.
+def vehicle_key(record):
+    return json.dumps([_value(record.get(col)) for col in VEHICLE_COLUMNS] + [_flag(record.get('is_new'))])
+
+# Converts a listing record into the payload the frontend would send for the same vehicle and questionnaire answers.
+# Used to build evaluation requests from listings data.
+def frontend_payload(record):
+    payload = {col: record.get(col) for col in VEHICLE_COLUMNS}
+    payload.update(FIXED_INPUTS)
+    payload.update({
+        'mileage': record.get('mileage'),
+        'dealer_zip': record.get('dealer_zip'),
+        'exterior_color': record.get('exterior_color'),
+        'interior_color': record.get('interior_color'),
+        'exterior_color_base': record.get('exterior_color'),
+        'interior_color_base': record.get('interior_color'),
+        'owner_count': 1 if record.get('owner_count') == 1 else 2,
+        'has_accidents': record.get('has_accidents'),
+        'frame_damaged': record.get('frame_damaged'),
+        'salvage': record.get('salvage'),
+        'theft_title': record.get('theft_title'),
+        'is_new': 'TRUE' if record.get('year') == datetime.now().year else 'FALSE',
+    })
+    return payload
+
+# Selects the vehicles to precompute from a DataFrame of listings or exported /api/predict payloads.
+# The top_n most common make/model/trim/year combinations are kept, each with its most frequent decoded specification.
+def select_profiles(df, top_n=2000):
+    counts = df.groupby(VEHICLE_COLUMNS, dropna=False).size().rename('count').reset_index()
+    counts['combination_count'] = counts.groupby(COMBINATION_COLUMNS, dropna=False)['count'].transform('sum')
+
+    # Sorting by the combination columns keeps every combination contiguous when counts are tied.
+    counts = counts.sort_values(
+        ['combination_count'] + COMBINATION_COLUMNS + ['count'],
+        ascending=[False] + [True] * len(COMBINATION_COLUMNS) + [False]
+    )
+    counts = counts.groupby(COMBINATION_COLUMNS, dropna=False, sort=False).head(1)
+
+    return counts[VEHICLE_COLUMNS].head(top_n).to_dict('records')
+
+# Most common values of a column, e.g. the colors to cover with adjustments.
+def common_values(df, column, top_n):
+    return df[column].dropna().value_counts().head(top_n).index.tolist()
+
+# Fingerprint of the parts of a trained model that the curves depend on,
+# used to ignore a table built from a different model without hashing the whole forest.
+def model_fingerprint(predictor):
+    digest = hashlib.sha256()
+    digest.update(repr(predictor.feature_cols).encode())
+    for col in sorted(predictor.encoders):
+        digest.update(col.encode())
+        digest.update(repr(predictor.encoders[col].classes_.tolist()).encode())
+    for estimator in predictor.model.estimators_:
+        digest.update(np.int64(estimator.tree_.node_count).tobytes())
+        digest.update(np.float64(estimator.tree_.value[0, 0, 0]).tobytes())
+    return digest.hexdigest()
+
+class DepreciationCurves:
+    def __init__(self):
+        # Vehicle keys, one per curve, and the index from key to curve.
+        self.vehicles = []
+        self.index = {}
+        # Index from color or zip prefix to its column in the adjustments.
+        self.exterior_index = {}
+        self.interior_index = {}
+        self.zip_index = {}
+        # Grid axes shared by all curves.
+        self.mileages = None
+        self.listed_years = None
+        self.listed_month = None
+        # Predicted values at the reference colors and zip as a float32
+        # (vehicles x owner counts x accident flags x mileages x listed years) array.
+        self.values = None
+        # Colors and zip prefixes covered by the table, the first of each is the reference the curves were scored with.
+        self.exterior_colors = []
+        self.interior_colors = []
+        self.zip_prefixes = []
+        # Change in value from the reference, as float32 (vehicles x colors or zip prefixes) arrays.
+        self.exterior_adjustments = None
+        self.interior_adjustments = None
+        self.zip_adjustments = None
+        self.fingerprint = None
+
+    def _build_index(self):
+        self.index = {key: i for i, key in enumerate(self.vehicles)}
+        self.exterior_index = {color: i for i, color in enumerate(self.exterior_colors)}
+        self.interior_index = {color: i for i, color in enumerate(self.interior_colors)}
+        self.zip_index = {prefix: i for i, prefix in enumerate(self.zip_prefixes)}
+
+    def _profile(self, record, exterior_color, interior_color, zip_prefix):
+        # Payload for a vehicle at the given colors and zip, with the frontend's fixed inputs and no condition flags.
+        profile = {col: record.get(col) for col in VEHICLE_COLUMNS}
+        profile.update(FIXED_INPUTS)
+        profile.update({
+            'mileage': 0,
+            'dealer_zip': zip_prefix + '00',
+            'exterior_color': exterior_color,
+            'interior_color': interior_color,
+            'exterior_color_base': exterior_color,
+            'interior_color_base': interior_color,
+            'owner_count': OWNER_COUNTS[0],
+            'has_accidents': ACCIDENT_FLAGS[0],
+            'is_new': 'TRUE' if record.get('year') == datetime.now().year else 'FALSE',
+        })
+        profile.update({flag: 'FALSE' for flag in FIXED_FLAGS})
+        return profile
+
+    def build(self, predictor, records, mileages, exterior_colors, interior_colors, zip_prefixes=None,
+              years=range(0, 11), chunk_size=20):
+        # Scores every vehicle over the owner count x accident x mileage x listing year grid with the live model,
+        # and measures the effect of each color and zip prefix on its value at a reference scenario.
+        # Listing years start at the current year, and the listing month is fixed to the current month,
+        # so the table should be rebuilt on a schedule and whenever the model is retrained.
+        # zip_prefixes defaults to every zip prefix the model was trained with.
+        if predictor.model is None:
+            raise Exception("Model not trained or loaded.")
+
+        if zip_prefixes is None:
+            zip_prefixes = [prefix for prefix in predictor.encoders['zip_prefix'].classes_ if prefix != 'unknown']
+
+        now = datetime.now()
+        self.mileages = np.asarray(mileages, dtype=np.float64)
+        self.listed_years = now.year + np.asarray(years, dtype=np.int64)
+        self.listed_month = now.month
+        self.exterior_colors = list(exterior_colors)
+        self.interior_colors = list(interior_colors)
+        self.zip_prefixes = [str(prefix) for prefix in zip_prefixes]
+        self.fingerprint = model_fingerprint(predictor)
+
+        # Each vehicle is prepared on its own, exactly like a single request, at the reference colors and zip.
+        reference = (self.exterior_colors[0], self.interior_colors[0], self.zip_prefixes[0])
+        bases = []
+        self.vehicles = []
+        seen = set()
+        for record in records:
+            key = vehicle_key(self._profile(record, *reference))
+            if key not in seen:
+                seen.add(key)
+                self.vehicles.append(key)
+                bases.append(predictor.prepare_input([self._profile(record, *reference)]))
+
+        if not bases:
+            raise Exception("No vehicle profiles to precompute.")
+
+        bases = pd.concat(bases, ignore_index=True)
+        self._build_index()
+
+        # Encoded color and zip columns only depend on the color or zip itself, so they are prepared once
+        # and copied into each vehicle's rows.
+        record = records[0]
+        exterior = predictor.prepare_input([self._profile(record, color, reference[1], reference[2]) for color in self.exterior_colors])
+        interior = predictor.prepare_input([self._profile(record, reference[0], color, reference[2]) for color in self.interior_colors])
+        zips = predictor.prepare_input([self._profile(record, reference[0], reference[1], prefix) for prefix in self.zip_prefixes])
+        variants = [
+            (exterior, ['exterior_color', 'exterior_color_base']),
+            (interior, ['interior_color', 'interior_color_base']),
+            (zips, ['zip_prefix']),
+        ]
+
+        # The full grid for a chunk of vehicles is scored in a single model call.
+        owner_grid, accident_grid, mileage_grid, year_grid = [
+            grid.ravel() for grid in np.meshgrid(
+                np.asarray(OWNER_COUNTS), np.arange(len(ACCIDENT_FLAGS)), self.mileages, self.listed_years, indexing='ij'
+            )
+        ]
+        points = len(mileage_grid)
+
+        values = []
+        adjustments = [[] for _ in variants]
+        for start in range(0, len(bases), chunk_size):
+            chunk = bases.iloc[start:start + chunk_size]
+
+            X = chunk.loc[chunk.index.repeat(points)].reset_index(drop=True)
+            X['owner_count'] = np.tile(owner_grid, len(chunk))
+            X['is_one_owner'] = (X['owner_count'] == 1).astype(int)
+            X['has_accidents'] = np.tile(accident_grid, len(chunk))
+            X = predictor.set_scenario_features(
+                X,
+                np.tile(mileage_grid, len(chunk)),
+                np.tile(year_grid, len(chunk)),
+                self.listed_month
+            )
+            predictions = predictor.model.predict(X[predictor.feature_cols])
+            values.append(predictions.reshape(
+                len(chunk), len(OWNER_COUNTS), len(ACCIDENT_FLAGS), len(self.mileages), len(self.listed_years)
+            ))
+
+            # Color and zip effects are measured at the current listing year with typical mileage for the vehicle's age.
+            age = np.maximum(1, now.year - chunk['year'].to_numpy())
+            for variant_index, (variant, columns) in enumerate(variants):
+                X = chunk.loc[chunk.index.repeat(len(variant))].reset_index(drop=True)
+                X[columns] = np.tile(variant[columns].to_numpy(), (len(chunk), 1))
+                X = predictor.set_scenario_features(
+                    X,
+                    np.repeat(age * REFERENCE_ANNUAL_MILEAGE, len(variant)).astype(np.float64),
+                    now.year,
+                    self.listed_month
+                )
+                predictions = predictor.model.predict(X[predictor.feature_cols]).reshape(len(chunk), len(variant))
+                adjustments[variant_index].append(predictions - predictions[:, :1])
+
+        self.values = np.concatenate(values).astype(np.float32)
+        self.exterior_adjustments, self.interior_adjustments, self.zip_adjustments = [
+            np.concatenate(blocks).astype(np.float32) for blocks in adjustments
+        ]
+
+        print(f'Precomputed {len(self.vehicles)} curves over {points} grid points each')
+
+    def is_compatible(self, predictor):
+        # A table can only answer requests for the exact model it was built from.
+        return self.values is not None and self.fingerprint == model_fingerprint(predictor)
+
+    def _interpolate(self, row, owner, accident, mileage, year_index):
+        # Linear interpolation over the mileage axis at exact listing years, vectorized over all points.
+        position = np.clip(np.searchsorted(self.mileages, mileage, side='right') - 1, 0, len(self.mileages) - 2)
+        low = self.mileages[position]
+        high = self.mileages[position + 1]
+        weight = (mileage - low) / (high - low)
+
+        low_values = self.values[row, owner, accident, position, year_index]
+        high_values = self.values[row, owner, accident, position + 1, year_index]
+        return low_values + weight * (high_values - low_values)
+
+    def lookup_timeline(self, vehicle_details, annual_mileage, years=range(1, 6)):
+        # Returns the same array as VehiclePredictor.predict_timeline() when the request is covered by the table,
+        # or None when the live model has to be used instead.
+        if self.values is None or len(self.mileages) < 2:
+            return None
+
+        row = self.index.get(vehicle_key(vehicle_details))
+        if row is None:
+            return None
+
+        # Inputs the table was built with a single value for.
+        if vehicle_details.get('listed_date') is not None:
+            return None
+        for col, value in FIXED_INPUTS.items():
+            if _value(vehicle_details.get(col)) != _value(value):
+                return None
+        if any(_flag(vehicle_details.get(flag)) for flag in FIXED_FLAGS):
+            return None
+
+        # Questionnaire inputs covered by the grid and the adjustments.
+        owner_count = _value(vehicle_details.get('owner_count'))
+        if owner_count not in OWNER_COUNTS:
+            return None
+        owner = OWNER_COUNTS.index(owner_count)
+        accident = int(_flag(vehicle_details.get('has_accidents')))
+
+        exterior_color = vehicle_details.get('exterior_color')
+        interior_color = vehicle_details.get('interior_color')
+        if vehicle_details.get('exterior_color_base', exterior_color) != exterior_color:
+            return None
+        if vehicle_details.get('interior_color_base', interior_color) != interior_color:
+            return None
+        exterior = self.exterior_index.get(exterior_color)
+        interior = self.interior_index.get(interior_color)
+        zip_prefix = self.zip_index.get(_zip_prefix(vehicle_details.get('dealer_zip')))
+        if exterior is None or interior is None or zip_prefix is None:
+            return None
+
+        # Scenario rows in the same order as build_timeline(): the vehicle today, then one row per year ahead.
+        current_mileage = _value(vehicle_details.get('mileage', 0))
+        if current_mileage is None:
+            return None
+        now = datetime.now()
+        if now.month != self.listed_month:
+            return None
+
+        years_ahead = np.asarray([0] + list(years), dtype=np.int64)
+        mileage = current_mileage + annual_mileage * years_ahead
+        if mileage.min() < self.mileages[0] or mileage.max() > self.mileages[-1]:
+            return None
+
+        listed_year = now.year + years_ahead
+        year_index = np.searchsorted(self.listed_years, listed_year)
+        if (year_index >= len(self.listed_years)).any() or (self.listed_years[year_index] != listed_year).any():
+            return None
+
+        adjustment = (
+            self.exterior_adjustments[row, exterior] +
+            self.interior_adjustments[row, interior] +
+            self.zip_adjustments[row, zip_prefix]
+        )
+        return self._interpolate(row, owner, accident, mileage, year_index) + adjustment
+
+    def evaluate(self, predictor, payloads):
+        # Looks up a sample of request payloads, e.g. built with frontend_payload() from recent listings,
+        # and compares the values answered from the table against the live model.
+        # Returns the share of requests the table answers and the error metrics of those answers,
+        # which should be checked before deploying a newly built table.
+        lookups = []
+        for payload in payloads:
+            annual_mileage = predictor.estimate_annual_mileage(payload)
+            values = self.lookup_timeline(payload, annual_mileage)
+            if values is not None:
+                lookups.append((payload, annual_mileage, values))
+
+        report = {
+            'samples': len(payloads),
+            'hits': len(lookups),
+            'hit_rate': len(lookups) / len(payloads) * 100 if payloads else 0.0,
+            'mae': None,
+            'mape': None,
+            'p95_error': None,
+            'max_error': None
+        }
+        if not lookups:
+            return report
+
+        X = pd.concat([
+            predictor.prepare_input(predictor.build_timeline(payload, annual_mileage))
+            for payload, annual_mileage, _ in lookups
+        ], ignore_index=True)
+        live = predictor.model.predict(X[predictor.feature_cols])
+        interpolated = np.concatenate([values for _, _, values in lookups])
+        errors = np.abs(interpolated - live)
+
+        report.update({
+            'mae': float(errors.mean()),
+            'mape': float((errors / np.maximum(np.abs(live), 1)).mean() * 100),
+            'p95_error': float(np.percentile(errors, 95)),
+            'max_error': float(errors.max())
+        })
+        return report
+
+    def save(self, filepath):
+        if self.values is None:
+            raise Exception("Curves not built.")
+
+        np.savez_compressed(
+            filepath,
+            vehicles=np.array(json.dumps(self.vehicles)),
+            mileages=self.mileages,
+            listed_years=self.listed_years,
+            listed_month=self.listed_month,
+            values=self.values,
+            exterior_colors=np.array(json.dumps(self.exterior_colors)),
+            interior_colors=np.array(json.dumps(self.interior_colors)),
+            zip_prefixes=np.array(json.dumps(self.zip_prefixes)),
+            exterior_adjustments=self.exterior_adjustments,
+            interior_adjustments=self.interior_adjustments,
+            zip_adjustments=self.zip_adjustments,
+            fingerprint=np.array(self.fingerprint)
+        )
+
+        print(f'Curves saved to {filepath}')
+
+    def load(self, filepath):
+        if not os.path.exists(filepath):
+            raise Exception(f"File {filepath} does not exist.")
+
+        with np.load(filepath) as data:
+            self.vehicles = json.loads(str(data['vehicles']))
+            self.mileages = data['mileages']
+            self.listed_years = data['listed_years']
+            self.listed_month = int(data['listed_month'])
+            self.values = data['values']
+            self.exterior_colors = json.loads(str(data['exterior_colors']))
+            self.interior_colors = json.loads(str(data['interior_colors']))
+            self.zip_prefixes = json.loads(str(data['zip_prefixes']))
+            self.exterior_adjustments = data['exterior_adjustments']
+            self.interior_adjustments = data['interior_adjustments']
+            self.zip_adjustments = data['zip_adjustments']
+            self.fingerprint = str(data['fingerprint'])
+
+        self._build_index()
+
+        print(f'Curves loaded from {filepath}')
@@ -0,0 +1,258 @@
+import glob
+import os
+import threading
+import time
+import traceback
+
+# ModelManager owns the model served by the API and replaces it without restarting the worker.
+# A background thread polls the artifact source for a new version, loads it next to the current one,
+# runs a canary prediction and only then swaps it in with a single reference assignment.
+# Requests take a snapshot of the current version when they start, so in-flight requests finish on the
+# version they started with while new requests use the new one.
+# The model code (pandas, scikit-learn) is imported when the first version is loaded, so a worker that loads
+# its model in the background can serve the routes that do not need it right away.
+
+# Retry delays after a failed load: RETRY_INTERVAL seconds, doubling after each consecutive failure up to MAX_RETRY_INTERVAL.
+RETRY_INTERVAL = 5
+MAX_RETRY_INTERVAL = 300
+
+class CanaryFailed(Exception):
+    # Raised when a loaded version produces an invalid canary value. Unlike download or load errors,
+    # retrying the same version gives the same result, so it is skipped until a newer one is published.
+    pass
+
+# Vehicle scored after loading a new version, it must produce a finite positive value before the version is served.
+CANARY_VEHICLE = {
+    'year': 2018,
+    'make_name': 'toyota',
+    'model_name': 'camry',
+    'trim_name': 'le',
+    'body_type': 'sedan',
+    'engine_type': 'i4',
+    'fuel_type': 'gasoline',
+    'horsepower': 203,
+    'transmission': 'a',
+    'wheel_system_display': 'front-wheel drive',
+    'torque': None,
+    'city_fuel_economy': None,
+    'highway_fuel_economy': None,
+    'combine_fuel_economy': None,
+    'mileage': 60000,
+    'dealer_zip': '10001',
+    'exterior_color': 'black',
+    'interior_color': 'black',
+    'exterior_color_base': 'black',
+    'interior_color_base': 'black',
+    'owner_count': 1,
+    'frame_damaged': 'FALSE',
+    'has_accidents': 'FALSE',
+    'salvage': 'FALSE',
+    'theft_title': 'FALSE',
+    'is_new': 'FALSE',
+    'daysonmarket': 30
+}
+
+class ModelVersion:
+    # A loaded model version: the version id, its predictor and the precomputed curves that match it, if any.
+    def __init__(self, version, predictor, curves=None):
+        self.version = version
+        self.predictor = predictor
+        self.curves = curves
+
+# Artifact sources. Each one reports the id of its latest version and returns a local path to load for a version.
+
+class LocalFileSource:
+    # A single model file, a new version is detected when the file is replaced.
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    def latest_version(self):
+        stat = os.stat(self.filepath)
+        return f'{os.path.basename(self.filepath)}@{int(stat.st_mtime)}-{stat.st_size}'
+
+    def fetch(self, version):
+        return self.filepath
+
+class LocalDirectorySource:
+    # A directory of versioned model files, the latest version is the file whose name sorts last,
+    # e.g. vehicle_predictor_2026-10-01.pkl. Files should be copied in under a temporary name and renamed into place.
+    def __init__(self, directory, pattern='*.pkl'):
+        self.directory = directory
+        self.pattern = pattern
+
+    def latest_version(self):
+        files = sorted(glob.glob(os.path.join(self.directory, self.pattern)))
+        if not files:
+            raise Exception(f'No model files found in {self.directory}.')
+        return os.path.basename(files[-1])
+
+    def fetch(self, version):
+        return os.path.join(self.directory, version)
+
+class HuggingFaceSource:
+    # A model file in a Hugging Face repo. Versions are the hash of the file itself, so commits that leave it
+    # unchanged (e.g. README edits) do not reload the model, and each version is downloaded at the commit that last changed it.
+    def __init__(self, repo_id, filename):
+        self.repo_id = repo_id
+        self.filename = filename
+        self._revisions = {}
+
+    def latest_version(self):
+        from huggingface_hub import HfApi
+        paths = HfApi().get_paths_info(self.repo_id, [self.filename], expand=True)
+        if not paths:
+            raise Exception(f'{self.filename} not found in {self.repo_id}.')
+
+        info = paths[0]
+        version = info.lfs.sha256 if info.lfs is not None else info.blob_id
+        self._revisions[version] = info.last_commit.oid
+        return version
+
+    def fetch(self, version):
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(repo_id=self.repo_id, filename=self.filename, revision=self._revisions[version])
+
+class ModelManager:
+    def __init__(self, source, scheduler=None, n_jobs=None, curves_path=None, poll_interval=300, warm_caches=False):
+        # source: one of the artifact sources above.
+        # scheduler: PredictionScheduler attached to every loaded predictor.
+        # n_jobs: sklearn threads per model call, None keeps the value the model was trained with.
+        # curves_path: precomputed curves file, used only for versions it was built from.
+        # poll_interval: seconds between checks for a new version, 0 disables polling.
+        # warm_caches: also build the lookup structures behind prediction intervals and explanations when loading.
+        # They add about a third to the memory of the forest, so by default they are built by the first request
+        # that uses them, on that request's thread rather than the scheduler's.
+        self.source = source
+        self.scheduler = scheduler
+        self.n_jobs = n_jobs
+        self.curves_path = curves_path
+        self.poll_interval = poll_interval
+        self.warm_caches = warm_caches
+
+        self._current = None
+        self._failed_version = None
+        self._failures = 0
+        self._swap_lock = threading.Lock()
+        self._poller_lock = threading.Lock()
+        self._poller_pid = None
+
+    def start(self, background=False):
+        # Loads the first version, either before returning or on a background thread while the app starts serving.
+        # Loading before returning lets gunicorn --preload share the model between its workers.
+        if background:
+            self._ensure_poller()
+        else:
+            self.check_for_update()
+
+    def current(self):
+        # Returns the ModelVersion to use for a request, or None if no version could be loaded yet.
+        self._ensure_poller()
+        return self._current
+
+    def load_version(self, version):
+        # Loads, warms and checks a version without affecting the one being served.
+        from models.predictor import VehiclePredictor
+        from models.curves import DepreciationCurves
+
+        predictor = VehiclePredictor()
+        predictor.load(self.source.fetch(version))
+        if self.n_jobs is not None:
+            predictor.model.n_jobs = self.n_jobs
+
+        # The caches are built here, before the scheduler is attached, so building them never occupies
+        # the executor that serves the model calls of live requests.
+        if self.warm_caches:
+            predictor.build_caches()
+
+        predictor.scheduler = self.scheduler
+        self._warm_up(predictor)
+
+        curves = None
+        if self.curves_path:
+            try:
+                curves = DepreciationCurves()
+                curves.load(self.curves_path)
+                if not curves.is_compatible(predictor):
+                    print(f'Precomputed curves do not match model version {version}, using live predictions only.')
+                    curves = None
+            except Exception as e:
+                print(f'Precomputed curves not loaded: {e}')
+                curves = None
+
+        return ModelVersion(version, predictor, curves)
+
+    def _warm_up(self, predictor):
+        # Scores the canary through the scheduler, so warming a new version takes its turn with live requests
+        # instead of competing with them for the cores, and rejects versions that cannot produce a sane value.
+        import numpy as np
+
+        annual_mileage = predictor.estimate_annual_mileage(CANARY_VEHICLE)
+        values = predictor.predict_timeline(CANARY_VEHICLE, annual_mileage)
+        if not np.all(np.isfinite(values)) or values[0] <= 0:
+            raise CanaryFailed(f'Canary prediction failed: {values}')
+
+    def check_for_update(self):
+        # Loads and swaps in the latest version if it differs from the one being served.
+        # Returns True if a new version was swapped in. Errors leave the current version in place.
+        # Download and load errors are retried by the poller with backoff, while a version that fails its canary
+        # is skipped until the source publishes another one, unless there is no version to serve at all.
+        with self._swap_lock:
+            version = None
+            try:
+                version = self.source.latest_version()
+                if self._current is not None and self._current.version == version:
+                    self._failures = 0
+                    return False
+                if self._current is not None and version == self._failed_version:
+                    self._failures = 0
+                    return False
+
+                loaded = self.load_version(version)
+            except Exception as e:
+                print(f'Model update to version {version} failed: {e}')
+                traceback.print_exc()
+                if isinstance(e, CanaryFailed):
+                    self._failed_version = version
+                self._failures += 1
+                return False
+
+            previous = self._current
+            self._current = loaded
+            self._failures = 0
+            print(f'Serving model version {version}' + (f' (was {previous.version})' if previous else ''))
+            return True
+
+    def _ensure_poller(self):
+        # The polling thread is started on first use in each process, as threads do not survive gunicorn's fork.
+        if self._poller_pid == os.getpid():
+            return
+
+        with self._poller_lock:
+            if self._poller_pid == os.getpid():
+                return
+            threading.Thread(target=self._poll, name='model-manager', daemon=True).start()
+            self._poller_pid = os.getpid()
+
+    def _next_check_delay(self):
+        # Seconds until the next check, or None to stop polling. After a failed load the check is retried sooner,
+        # with exponential backoff, and a process without a version keeps retrying even when polling is disabled.
+        backoff = min(RETRY_INTERVAL * 2 ** max(self._failures - 1, 0), MAX_RETRY_INTERVAL)
+        if self._current is None:
+            return backoff
+        if self.poll_interval <= 0:
+            return None
+        if self._failures:
+            return min(backoff, self.poll_interval)
+        return self.poll_interval
+
+    def _poll(self):
+        # A process that has no version yet, e.g. one started with background loading, loads one right away.
+        if self._current is None:
+            self.check_for_update()
+
+        while True:
+            delay = self._next_check_delay()
+            if delay is None:
+                return
+            time.sleep(delay)
+            self.check_for_update()
@@ -0,0 +1,48 @@
+from models.predictor import VehiclePredictor
+from models.curves import DepreciationCurves, select_profiles, common_values, frontend_payload
+
+# Script to precompute depreciation curves for the most popular vehicles and save them for the /api/predict route.
+# Run from the backend directory with: python -m models.precompute_curves
+# Loads the trained model, picks the top make/model/trim/year combinations and the most common colors from the data,
+# scores them over the owner count x accident x mileage x listing year grid, and reports how many requests the table
+# answers and its error against the live model before saving.
+# The table is tied to the model it was built from and to the current listing month, so rerun this after each retrain
+# and on a monthly schedule.
+def main():
+    # Load trained model
+    predictor = VehiclePredictor()
+    predictor.load('models/saved/vehicle_predictor_model_3m.pkl')
+
+    # Select the most common vehicles and colors from the cleaned data
+    df = predictor.load_data('../data/processed/used_cars_data_cleaned.csv')
+    records = select_profiles(df, top_n=2000)
+
+    # Precompute curves from 0 to 300k miles in 5k steps, for the current year and the next 10 years,
+    # with adjustments for the 30 most common exterior and interior colors and every zip prefix the model knows
+    curves = DepreciationCurves()
+    curves.build(
+        predictor,
+        records,
+        mileages=range(0, 300001, 5000),
+        exterior_colors=common_values(df, 'exterior_color', 30),
+        interior_colors=common_values(df, 'interior_color', 30),
+        years=range(0, 11)
+    )
+
+    # Share of requests answered from the table and accuracy of those answers against the live model,
+    # using listings sent the way the frontend sends them
+    payloads = [frontend_payload(record) for record in df.sample(n=min(len(df), 2000), random_state=42).to_dict('records')]
+    report = curves.evaluate(predictor, payloads)
+    print(f"Samples: {report['samples']}, Hit rate: {report['hit_rate']:.1f}%")
+    if report['hits']:
+        print(
+            f"MAE: ${report['mae']:,.2f}, MAPE: {report['mape']:.2f}%, "
+            f"P95 error: ${report['p95_error']:,.2f}, Max error: ${report['max_error']:,.2f}"
+        )
+
+    # Save curves
+    curves.save('models/saved/depreciation_curves.npz')
+
+
+if __name__ == "__main__":
+    main()
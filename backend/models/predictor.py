@@ -2,22 +2,42 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split, RandomizedSearchCV
-from sklearn.preprocessing import LabelEncoder
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+import threading
+from scipy import sparse
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from services.normalizer import normalize_colors
 import warnings
 warnings.filterwarnings('ignore')
 
-# VehiclePredictor class used for the model training, prediction, and saving/loading functionalities.
+# VehiclePredictor class used for the model prediction, and saving/loading functionalities.
 # The predict and predict_future methods will later be used in the API endpoint /api/predict to generate the final predictions.
+# Training lives in models/train.py, so serving does not import the training and evaluation modules of scikit-learn.
 class VehiclePredictor:
     def __init__(self):
         self.model = None
         self.encoders = {}
         self.feature_cols = []
+        # Optional PredictionScheduler (models/scheduler.py) that batches model calls from concurrent requests.
+        # When it is not set, the model is called directly on the calling thread.
+        self.scheduler = None
+        self._cache_lock = threading.Lock()
+        self._clear_cache()
+
+    def _clear_cache(self):
+        # Lookup structures derived from the forest are built lazily and must be reset whenever the model changes.
+        # Per-node contribution matrix used by explain().
+        self._contribution_matrix = None
+        self._contribution_bias = None
+        # Flattened node values of every tree and the offset of each tree within them, used by tree_predictions().
+        self._node_values = None
+        self._node_offsets = None
+
+    def build_caches(self):
+        # Builds the lookup structures behind predict_timeline_interval() and explain() up front,
+        # e.g. on the thread that loads a new model version before it is served.
+        self._ensure_node_values()
+        self._ensure_contribution_matrix()
 
     def load_data(self, filepath):
         df = pd.read_csv(filepath)
@@ -47,6 +67,11 @@ class VehiclePredictor:
             df['dealer_zip'] = df['dealer_zip'].fillna('00000').astype(str).str.replace('.0', '', regex=False)
             df['zip_prefix'] = df['dealer_zip'].str[:3]
 
+        # Canonicalize the detailed exterior/interior colors into the base colors using data/color_mappings.json.
+        # The training data was processed with the same mappings, and the frontend sends the detailed color as the base,
+        # so deriving the base colors here keeps training and prediction inputs consistent.
+        df = normalize_colors(df)
+
         # Numeric features for model and handling missing values using median imputation
         numeric_features = [
             'year',
@@ -123,6 +148,7 @@ class VehiclePredictor:
         for col in categorical_cols:
             # Fit and save new encoders if fit=True, only used during training.
             if fit:
+                from sklearn.preprocessing import LabelEncoder
                 label_encoder = LabelEncoder()
                 X_encoded[col] = label_encoder.fit_transform(X[col])
                 self.encoders[col] = label_encoder
@@ -144,51 +170,22 @@ class VehiclePredictor:
 
         return X_encoded
 
-    def train(self, df):
-        # Main function to train the model.
-        # This function sets up the data by encoding features, and using a train-test split.
-        # It also initializes the RandomForestRegressor with hyperparameters found using RandomizedSearchCV,
-        # then fits the model to the training data and evaluates its peformance. 
-        X, y = self.prepare_features(df)
-
-        self.feature_cols = X.columns.tolist()
-
-        X = self.encode_categorical(X, fit=True)
-
-        # Splits data into training and testing sets (80% train, 20% test)
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = 0.2, random_state = 42)
-
-        # Hyperparameter tuning:
-        # The optimal parameters were found using RandomizedSearchCV on initial runs,
-        # as tuning with multiple parameter combinations was time and space consuming.
-        # I set up a parameters dictionary with the ranges I wanted to try for each hyperparameter, and 
-        # used RandomizedSearchCV to search through the combinations of these parameters.
-        # The best parameters were then used to train the final model below.
-        regr = RandomForestRegressor(
-            n_estimators=150, 
-            max_depth=25, 
-            min_samples_split=10, 
-            min_samples_leaf=4, 
-            max_features=0.3,
-            random_state=42,
-            n_jobs=-1
-        ) 
-
-        # Train the model on the training data
-        regr.fit(X_train, y_train)
-        self.model = regr
+    def prepare_input(self, records):
+        # Converts one or more vehicle detail dictionaries into the encoded feature matrix the model expects.
+        # Scoring several rows at once lets callers like predict_timeline() and explain() pay for a single model call.
+        df = pd.DataFrame(records)
 
-        # Evaluate the model on the test data
-        y_pred = regr.predict(X_test)
-
-        # Evaluation metrics 
-        # The project goals specified r2 >= 0.78, RMSE <= $10,000, MAE <= $2,000.
-        mae = mean_absolute_error(y_test, y_pred)
-        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-        r2 = r2_score(y_test, y_pred)
-
-        print(f'MAE: ${mae:,.2f}, RMSE: ${rmse:,.2f}, R2: {r2:.3f}')
+        # Added for current listing_date changes
+        # In the instance a user does not provide a listing date, this will default to the current date.
+        today = datetime.now().strftime('%m/%d/%Y')
+        if 'listed_date' not in df.columns:
+            df['listed_date'] = today
+        else:
+            df['listed_date'] = df['listed_date'].fillna(today)
 
+        # Use the same feature preparation and encoding as during training
+        X, _ = self.prepare_features(df)
+        return self.encode_categorical(X, fit=False)
 
     def predict(self, vehicle_details):
         # This function used the trained model to predict the current value of a single vehicle.
@@ -199,20 +196,10 @@ class VehiclePredictor:
         if self.model is None:
             raise Exception("Model not trained or loaded.")
 
-        # Convert input dictionary to DataFrame
-        df = pd.DataFrame([vehicle_details])
-
-        # Added for current listing_date changes
-        # In the instance a user does not provide a listing date, this will default to the current date.
-        if 'listed_date' not in df.columns:
-            df['listed_date'] = datetime.now().strftime('%m/%d/%Y')
-
-        # Use the same feature preparation and encoding as during training
-        X, _ = self.prepare_features(df)
-        X = self.encode_categorical(X, fit=False)
+        X = self.prepare_input([vehicle_details])
 
         # Generate and return prediction
-        prediction = self.model.predict(X)
+        prediction = self._score(X)
         return prediction[0]
 
     def predict_future(self, vehicle_details, years_ahead, annual_mileage):
@@ -234,6 +221,222 @@ class VehiclePredictor:
         # Call the predict method using the updated future data.
         return self.predict(future_details)
 
+    def estimate_annual_mileage(self, vehicle_details):
+        # Estimates how many miles per year the vehicle is driven, used to project mileage into the future.
+        current_year = datetime.now().year
+        # Ensure the vehicle age is at least 1 to avoid division by zero, and calculate annual mileage.
+        vehicle_age = max(1, current_year - vehicle_details['year'])
+        annual_mileage = vehicle_details['mileage'] / vehicle_age
+
+        # To accurately predict future mileage for new vehicles, this sets a threshold for low mileage and a default annual mileage.
+        # if the current annual mileage is less than the threshold, set the annual mileage to the default.
+        low_mileage_threshold = 1000
+        default_annual_mileage = 12000
+        if annual_mileage < low_mileage_threshold:
+            annual_mileage = default_annual_mileage
+
+        return annual_mileage
+
+    def build_timeline(self, vehicle_details, annual_mileage, years=range(1, 6)):
+        # Builds the scenario rows for a depreciation timeline: the vehicle as it is today,
+        # followed by one row per future year with projected mileage and a future listing date.
+        current_mileage = vehicle_details.get('mileage', 0)
+        records = [vehicle_details]
+        for year in years:
+            future_details = vehicle_details.copy()
+            future_details['mileage'] = current_mileage + (annual_mileage * year)
+            future_date = datetime.now() + relativedelta(years=year)
+            future_details['listed_date'] = future_date.strftime('%m/%d/%Y')
+            records.append(future_details)
+
+        return records
+
+    def predict_timeline(self, vehicle_details, annual_mileage, years=range(1, 6)):
+        # Predicts the current value and the value for each future year in a single model call.
+        # Returns an array where index 0 is the current value and the remaining entries follow the order of years.
+        if self.model is None:
+            raise Exception("Model not trained or loaded.")
+
+        X = self.prepare_input(self.build_timeline(vehicle_details, annual_mileage, years))
+        return self._score(X)
+
+    def build_grid(self, vehicle_details, annual_mileages, years):
+        # Builds the encoded feature matrix for a mileage x horizon what-if grid, one row per (annual mileage, year) pair.
+        # The vehicle is prepared and encoded once, and only the mileage and listing date features are
+        # recomputed for each scenario the same way prepare_features() derives them.
+        base = self.prepare_input([vehicle_details])
+
+        annual_mileages = np.asarray(annual_mileages, dtype=float)
+        years = np.asarray(years, dtype=int)
+        annual_grid, years_grid = np.meshgrid(annual_mileages, years, indexing='ij')
+        annual_grid = annual_grid.ravel()
+        years_grid = years_grid.ravel()
+
+        X = base.loc[base.index.repeat(len(annual_grid))].reset_index(drop=True)
+
+        # Future listing dates keep the current month and move the year forward, matching relativedelta(years=n).
+        now = datetime.now()
+        mileage = vehicle_details.get('mileage', 0) + annual_grid * years_grid
+        return self.set_scenario_features(X, mileage, now.year + years_grid, now.month)
+
+    def set_scenario_features(self, X, mileage, listed_year, listed_month):
+        # Overwrites the mileage and listing date features of an encoded feature matrix in place,
+        # deriving vehicle_age and mileage_per_year the same way prepare_features() does.
+        vehicle_age = np.clip(listed_year - X['year'].to_numpy(), 0, None)
+
+        X['mileage'] = mileage
+        X['listed_year'] = listed_year
+        X['listed_month'] = listed_month
+        X['vehicle_age'] = vehicle_age
+        X['mileage_per_year'] = mileage / (vehicle_age + 1)
+
+        return X
+
+    def predict_grid(self, vehicle_details, annual_mileages, years):
+        # Predicts the value for every combination of annual mileage and years ahead in a single model call.
+        # Returns a (annual mileages x years) array.
+        if self.model is None:
+            raise Exception("Model not trained or loaded.")
+
+        X = self.build_grid(vehicle_details, annual_mileages, years)
+        return self._score(X).reshape(len(annual_mileages), len(years))
+
+    def predict_timeline_interval(self, vehicle_details, annual_mileage, years=range(1, 6), coverage=0.8):
+        # Predicts the timeline values along with a prediction interval taken from the spread of the individual trees.
+        # The forest prediction is the mean of its trees, so the point values come from the same pass at no extra cost.
+        # Returns (values, lower, upper) arrays ordered like predict_timeline().
+        if self.model is None:
+            raise Exception("Model not trained or loaded.")
+
+        # The cache is built on the request thread, so a scheduler executor never spends a model call building it.
+        self._ensure_node_values()
+        X = self.prepare_input(self.build_timeline(vehicle_details, annual_mileage, years))
+        tree_predictions = self._score(X, output='trees')
+
+        tail = (1 - coverage) / 2 * 100
+        lower, upper = np.percentile(tree_predictions, [tail, 100 - tail], axis=1)
+        return tree_predictions.mean(axis=1), lower, upper
+
+    def tree_predictions(self, X):
+        # Returns a (rows x trees) matrix with the prediction of every tree for every row of an encoded feature matrix.
+        # apply() finds the leaf each row lands in for all trees in one call, and the leaf values are then
+        # gathered from a flattened array of node values instead of calling each estimator separately.
+        self._ensure_node_values()
+        leaves = self.model.apply(X)
+        return self._node_values[leaves + self._node_offsets]
+
+    def _ensure_node_values(self):
+        # The offsets are assigned before the values, which are checked, so concurrent callers never see half a cache.
+        if self._node_values is not None:
+            return
+
+        with self._cache_lock:
+            if self._node_values is None:
+                self._node_offsets = np.cumsum(
+                    [0] + [estimator.tree_.node_count for estimator in self.model.estimators_[:-1]]
+                )
+                self._node_values = np.concatenate([
+                    estimator.tree_.value[:, 0, 0] for estimator in self.model.estimators_
+                ])
+
+    def explain(self, vehicle_details, annual_mileage=None, years=range(1, 6)):
+        # Breaks down each timeline prediction into per-feature contributions.
+        # Every tree prediction equals the root value plus the change in node value at each split along the decision path,
+        # so crediting each change to the split feature and averaging over the forest gives
+        # prediction = base_value + sum(contributions) for every row.
+        if self.model is None:
+            raise Exception("Model not trained or loaded.")
+
+        if annual_mileage is None:
+            annual_mileage = self.estimate_annual_mileage(vehicle_details)
+
+        self._ensure_contribution_matrix()
+        X = self.prepare_input(self.build_timeline(vehicle_details, annual_mileage, years))
+        contributions = self._score(X, output='contributions')
+        values = self._contribution_bias + contributions.sum(axis=1)
+
+        scenarios = []
+        for row, year in enumerate([0] + list(years)):
+            scenarios.append({
+                'year': year,
+                'value': float(values[row]),
+                'contributions': {
+                    feature: float(contribution)
+                    for feature, contribution in zip(self.feature_cols, contributions[row])
+                }
+            })
+
+        return {
+            'base_value': float(self._contribution_bias),
+            'current': scenarios[0],
+            'timeline': scenarios[1:]
+        }
+
+    def feature_contributions(self, X):
+        # Returns a (rows x features) matrix of per-feature contributions for an encoded feature matrix.
+        # The forest decision path is one indicator matrix of (rows x all nodes of all trees),
+        # so a single sparse product scores every row against every tree at once.
+        self._ensure_contribution_matrix()
+        indicator, _ = self.model.decision_path(X)
+        return (indicator @ self._contribution_matrix).toarray()
+
+    def score(self, X, output='predict'):
+        # Runs the model on an encoded feature matrix and returns one result per row:
+        # 'predict' for the forest prediction, 'trees' for every tree's prediction and 'contributions' for explain().
+        if output == 'predict':
+            return self.model.predict(X)
+        elif output == 'trees':
+            return self.tree_predictions(X)
+        elif output == 'contributions':
+            return self.feature_contributions(X)
+        raise ValueError(f'Unknown output {output}')
+
+    def _score(self, X, output='predict'):
+        # Sends model calls through the scheduler when one is attached, so they can be batched with other requests.
+        if self.scheduler is not None:
+            return self.scheduler.submit(self, X, output)
+        return self.score(X, output)
+
+    def _ensure_contribution_matrix(self):
+        if self._contribution_matrix is not None:
+            return
+
+        with self._cache_lock:
+            if self._contribution_matrix is None:
+                self._build_contribution_matrix()
+
+    def _build_contribution_matrix(self):
+        # Precomputes a sparse (all nodes x features) matrix holding, for every non-root node,
+        # the change in value from its parent credited to the feature the parent split on.
+        # Rows are stacked in estimator order to line up with the columns returned by decision_path().
+        n_features = len(self.feature_cols)
+        n_trees = len(self.model.estimators_)
+        blocks = []
+        bias = 0.0
+
+        for estimator in self.model.estimators_:
+            tree = estimator.tree_
+            values = tree.value[:, 0, 0]
+
+            parents = np.full(tree.node_count, -1)
+            internal = np.where(tree.children_left != -1)[0]
+            parents[tree.children_left[internal]] = internal
+            parents[tree.children_right[internal]] = internal
+
+            nodes = np.where(parents >= 0)[0]
+            deltas = values[nodes] - values[parents[nodes]]
+            features = tree.feature[parents[nodes]]
+
+            blocks.append(sparse.csr_matrix(
+                (deltas / n_trees, (nodes, features)),
+                shape=(tree.node_count, n_features)
+            ))
+            bias += values[0]
+
+        # The bias is assigned before the matrix, which is checked, so concurrent callers never see half a cache.
+        self._contribution_bias = bias / n_trees
+        self._contribution_matrix = sparse.vstack(blocks, format='csr')
+
     # Save model along with encoders and feature columns
     def save(self, filepath):
         if self.model is None:
@@ -259,5 +462,6 @@ class VehiclePredictor:
             self.model = model_data['model']
             self.encoders = model_data['encoders']
             self.feature_cols = model_data['feature_cols']
+            self._clear_cache()
         
         print(f'Model loaded from {filepath}')
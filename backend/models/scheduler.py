@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from collections import deque
+
+# PredictionScheduler sits between the request threads and the model.
+# Every model call is queued and run by a fixed number of executor threads, so a burst of requests cannot make
+# every worker score the forest at the same time and oversubscribe the cores. Calls that arrive within a short
+# window are micro-batched: their feature matrices are concatenated and scored in a single model call.
+# When the queue is full, new calls fail fast with SchedulerSaturated so the route can answer 503 with Retry-After.
+
+class SchedulerSaturated(Exception):
+    # Raised when a model call cannot be queued or is not started in time.
+    def __init__(self, retry_after):
+        super().__init__('Prediction queue is full, please retry later.')
+        self.retry_after = retry_after
+
+class _Job:
+    def __init__(self, predictor, X, output):
+        self.predictor = predictor
+        self.X = X
+        self.output = output
+        self.enqueued = time.monotonic()
+        self.started = False
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+class PredictionScheduler:
+    def __init__(self, max_concurrency=1, max_queue=32, batch_window=0.005, max_batch_rows=2048, timeout=30, retry_after=1):
+        # max_concurrency: number of model calls that may run at the same time in this process.
+        # max_queue: number of calls allowed to wait, beyond which new calls are rejected.
+        # batch_window: seconds to wait after the first queued call for others to join its batch.
+        # max_batch_rows: maximum rows scored together, a single larger call still runs on its own.
+        # timeout: seconds a call may wait in the queue before it is rejected.
+        # retry_after: seconds suggested to rejected clients in the Retry-After header.
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.batch_window = batch_window
+        self.max_batch_rows = max_batch_rows
+        self.timeout = timeout
+        self.retry_after = retry_after
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_workers(self):
+        # Executor threads are started on first use in each process. Threads do not survive a fork,
+        # so a scheduler created before gunicorn forks its workers (--preload) starts its own threads in every worker.
+        if self._pid == os.getpid():
+            return
+
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = deque()
+            self._condition = threading.Condition()
+            for i in range(self.max_concurrency):
+                threading.Thread(target=self._run_worker, name=f'prediction-scheduler-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, predictor, X, output='predict'):
+        # Queues a model call and blocks until its batch has been scored, returning the rows for X.
+        self._ensure_workers()
+        job = _Job(predictor, X, output)
+
+        with self._condition:
+            if len(self._queue) >= self.max_queue:
+                raise SchedulerSaturated(self.retry_after)
+            self._queue.append(job)
+            self._condition.notify()
+
+        if not job.done.wait(self.timeout):
+            with self._condition:
+                # A call that was never started is removed from the queue so it no longer counts towards max_queue,
+                # a running one is waited for since its batch is already scoring.
+                if not job.started:
+                    self._queue.remove(job)
+                    raise SchedulerSaturated(self.retry_after)
+            job.done.wait()
+
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _next_batch(self):
+        # Waits for a job, lets the batch window elapse, then takes every queued job that can be scored
+        # with it (same model and output) up to max_batch_rows.
+        with self._condition:
+            while True:
+                while not self._queue:
+                    self._condition.wait()
+
+                first = self._queue[0]
+                remaining = first.enqueued + self.batch_window - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+
+                batch = []
+                rows = 0
+                kept = deque()
+                while self._queue:
+                    job = self._queue.popleft()
+                    compatible = not batch or (job.predictor is batch[0].predictor and job.output == batch[0].output)
+                    if compatible and (not batch or rows + len(job.X) <= self.max_batch_rows):
+                        job.started = True
+                        batch.append(job)
+                        rows += len(job.X)
+                    else:
+                        kept.append(job)
+                self._queue = kept
+
+                if batch:
+                    return batch
+
+    def _run_worker(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                predictor = batch[0].predictor
+                if len(batch) == 1:
+                    results = [predictor.score(batch[0].X, batch[0].output)]
+                else:
+                    import pandas as pd
+                    scored = predictor.score(pd.concat([job.X for job in batch], ignore_index=True), batch[0].output)
+                    results = []
+                    start = 0
+                    for job in batch:
+                        results.append(scored[start:start + len(job.X)])
+                        start += len(job.X)
+
+                for job, result in zip(batch, results):
+                    job.result = result
+            except Exception as e:
+                for job in batch:
+                    job.error = e
+            finally:
+                for job in batch:
+                    job.done.set()
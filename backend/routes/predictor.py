@@ -1,28 +1,85 @@
 from flask import Blueprint, request, jsonify
 import sys
 import os
-from datetime import datetime
 from database.predictions import insert_prediction, get_prediction_by_id 
-from huggingface_hub import hf_hub_download
-import pickle
 
-from models.predictor import VehiclePredictor
+from models.manager import ModelManager, LocalFileSource, LocalDirectorySource, HuggingFaceSource
+from models.scheduler import PredictionScheduler, SchedulerSaturated
 
 # Initialize Blueprint
 prediction_bp = Blueprint('prediction', __name__)
 
-# Initialize predictor class and load the model from the specified path
-predictor = VehiclePredictor()
+# Model calls from concurrent requests go through a scheduler that limits how many run at once in this worker,
+# micro-batches calls arriving within a few milliseconds, and rejects calls with 503 when its queue is full.
+scheduler = PredictionScheduler(
+    max_concurrency = int(os.getenv('PREDICT_MAX_CONCURRENCY', '1')),
+    max_queue = int(os.getenv('PREDICT_MAX_QUEUE', '32')),
+    batch_window = float(os.getenv('PREDICT_BATCH_WINDOW_MS', '5')) / 1000,
+    max_batch_rows = int(os.getenv('PREDICT_MAX_BATCH_ROWS', '2048')),
+    timeout = float(os.getenv('PREDICT_QUEUE_TIMEOUT', '30')),
+    retry_after = int(os.getenv('PREDICT_RETRY_AFTER', '1'))
+)
+
+# Where new model versions are published:
+# MODEL_PATH for a single local file (for example the load test fixture model in loadtest/),
+# MODEL_DIR for a directory of versioned files, or by default the model file in the Hugging Face repo.
+if os.getenv('MODEL_PATH'):
+    model_source = LocalFileSource(os.getenv('MODEL_PATH'))
+elif os.getenv('MODEL_DIR'):
+    model_source = LocalDirectorySource(os.getenv('MODEL_DIR'))
+else:
+    model_source = HuggingFaceSource(
+        repo_id = 'emares17/vehicle-value-predictor',
+        filename = 'vehicle_predictor_model_3m.pkl'
+    )
 
-MODEL_PATH = hf_hub_download(
-    repo_id='emares17/vehicle-value-predictor',
-    filename='vehicle_predictor_model_3m.pkl'
+# The model manager loads the model, checks for new versions every MODEL_POLL_INTERVAL seconds and swaps them in
+# after a canary prediction, without restarting the worker. Requests use the version that was current when they started.
+# With MODEL_BACKGROUND_LOAD=true the model is loaded on a background thread, so a new worker serves /api/vin-lookup
+# right away and answers prediction requests with 503 until the model is ready. This does not combine with
+# gunicorn --preload, where the model should be loaded before forking to be shared between the workers.
+# PREDICT_N_JOBS sets the threads used per model call. The scheduler only limits model calls within this worker,
+# so every worker scoring on all cores would oversubscribe them. By default the cores are divided between the
+# gunicorn workers given by WEB_CONCURRENCY, or a single thread is used when the number of workers is unknown.
+# PREDICT_WARM_EXPLAIN=true builds the lookup structures behind prediction intervals and explanations when a version
+# is loaded, instead of on the first request that asks for them.
+# CURVES_PATH optionally points to precomputed depreciation curves built by models/precompute_curves.py,
+# which are used only with the model version they were built from.
+if os.getenv('PREDICT_N_JOBS'):
+    n_jobs = int(os.getenv('PREDICT_N_JOBS'))
+elif os.getenv('WEB_CONCURRENCY'):
+    n_jobs = max(1, (os.cpu_count() or 1) // int(os.getenv('WEB_CONCURRENCY')))
+else:
+    n_jobs = 1
+
+model_manager = ModelManager(
+    model_source,
+    scheduler = scheduler,
+    n_jobs = n_jobs,
+    curves_path = os.getenv('CURVES_PATH'),
+    poll_interval = float(os.getenv('MODEL_POLL_INTERVAL', '300')),
+    warm_caches = os.getenv('PREDICT_WARM_EXPLAIN', 'false').lower() == 'true'
 )
+model_manager.start(background = os.getenv('MODEL_BACKGROUND_LOAD', 'false').lower() == 'true')
+
+# Response for requests rejected by the scheduler, telling the client when to retry.
+def busy_response(error):
+    response = jsonify({
+        'error': 'The server is busy, please try again shortly.'
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
 
-try:
-    predictor.load(MODEL_PATH)
-except Exception as e:
-    predictor = None
+# Response while no model version is loaded, e.g. when it is still loading in the background.
+def model_unavailable_response():
+    response = jsonify({
+        'error': 'Model not loaded'
+    })
+    response.headers['Retry-After'] = str(scheduler.retry_after)
+    return response, 503
+
+# Default coverage of the prediction interval, i.e. the 10th to 90th percentile of the individual tree predictions.
+DEFAULT_INTERVAL_COVERAGE = 0.8
 
 # API endpoint to generate predictions, will make use of both predict() and predict_future() methods along with mileage projections.
 # This endpoint expects a payload from the frontend including data extracted from the NHTSA API and user inputs.
@@ -30,10 +87,12 @@ except Exception as e:
 def predict_vehicle_equity():
     try:
         # Perfrom initial check for the model and the request payload.
-        if predictor == None:
-            return jsonify({
-                'error': 'Model not loaded'
-            }), 500
+        # The model version is taken once, so the whole request uses the same version even if a new one is swapped in.
+        model = model_manager.current()
+        if model is None:
+            return model_unavailable_response()
+        predictor = model.predictor
+        curves = model.curves
         
         data = request.get_json()
         if not data:
@@ -71,41 +130,65 @@ def predict_vehicle_equity():
             'is_new': data.get('is_new')
         }
         
-        # Generate a prediction for the current value of the vehicle.
-        current_value = predictor.predict(data) 
+        # Estimate how many miles the vehicle is driven per year to project future mileage.
+        annual_mileage = predictor.estimate_annual_mileage(data)
+        years = range(1, 6)
 
-        # Calculate future values in the loop below.
-        future_values = []
-        current_year = datetime.now().year
-        # Ensure the vehicle age is at least 1 to avoid division by zero, and calculate annual mileage.
-        vehicle_age = max(1, current_year - data['year'])
-        current_mileage = data.get('mileage', 0)
-        annual_mileage = data['mileage'] / vehicle_age
-
-        # To accurately predict future mileage for new vehicles, this sets a threshold for low mileage and a default annual mileage.
-        # if the current annual mileage is less than the threshold, set the annual mileage to the default.
-        low_mileage_threshold = 1000
-        default_annual_mileage = 12000
-        if annual_mileage < low_mileage_threshold:
-            annual_mileage = default_annual_mileage
-
-        # Project future values for the next 5 years.
-        for year in range(1, 6):
-            future_data = data.copy()
-            # Update projected mileage for future predictions.
-            future_data['mileage'] = current_mileage + (annual_mileage * year)
-            # Predict future value using the updated mileage and year.
-            future_value = predictor.predict_future(
-                future_data, 
-                years_ahead = year, 
-                annual_mileage = annual_mileage
+        # Optional prediction interval, either True for the default coverage or a fraction between 0 and 1.
+        interval = data.get('interval')
+        coverage = None
+        if interval is True:
+            coverage = DEFAULT_INTERVAL_COVERAGE
+        elif interval:
+            if isinstance(interval, bool) or not isinstance(interval, (int, float)) or not 0 < interval < 1:
+                return jsonify({
+                    'error': 'Interval coverage must be a number between 0 and 1'
+                }), 400
+            coverage = float(interval)
+
+        # Generate the current value and the projected values for the next 5 years.
+        # When an explanation is requested, the per-feature contributions already add up to each prediction,
+        # so the values are taken from the explanation instead of scoring the forest twice.
+        # Likewise, the interval is computed from per-tree predictions whose mean is the point prediction.
+        explanation = None
+        if data.get('explain'):
+            explanation = predictor.explain(data, annual_mileage = annual_mileage, years = years)
+
+        lower = upper = None
+        value_source = 'model'
+        if coverage is not None:
+            values, lower, upper = predictor.predict_timeline_interval(
+                data,
+                annual_mileage,
+                years = years,
+                coverage = coverage
             )
-            # Append to the future values array.
-            future_values.append({
+        elif explanation is not None:
+            values = [explanation['current']['value']] + [scenario['value'] for scenario in explanation['timeline']]
+        elif curves is not None:
+            # Interpolate from the precomputed curves when the vehicle is in the table, else fall back to the model.
+            values = curves.lookup_timeline(data, annual_mileage, years = years)
+            if values is not None:
+                value_source = 'precomputed'
+            else:
+                values = predictor.predict_timeline(data, annual_mileage, years = years)
+        else:
+            values = predictor.predict_timeline(data, annual_mileage, years = years)
+
+        current_value = values[0]
+
+        # Build the future values array from the remaining timeline predictions.
+        future_values = []
+        for index, year in enumerate(years, start = 1):
+            future_value = {
                 'year': year,
-                'value': float(future_value),
+                'value': float(values[index]),
                 'projected_mileage': annual_mileage
-            })
+            }
+            if coverage is not None:
+                future_value['lower'] = float(lower[index])
+                future_value['upper'] = float(upper[index])
+            future_values.append(future_value)
 
         # Prepare the response to the frontend.
         response = {
@@ -115,8 +198,22 @@ def predict_vehicle_equity():
                 'future_values': future_values,
                 'annual_mileage': annual_mileage,
                 'depreciation_timeline': future_values,
+                'value_source': value_source,
+                'model_version': model.version,
             }
         }
+        # Include the prediction interval for the current value when requested.
+        if coverage is not None:
+            response['data']['current_value_interval'] = {
+                'lower': float(lower[0]),
+                'upper': float(upper[0]),
+                'coverage': coverage
+            }
+
+        # Include the feature contributions behind each value when requested.
+        if explanation is not None:
+            response['data']['explanation'] = explanation
+
         # Store the prediction in the database and return the prediction ID.
         prediction_id = insert_prediction(
             vin = data.get('vin'),
@@ -132,6 +229,8 @@ def predict_vehicle_equity():
             'success': True,
             'prediction_id': prediction_id
         }), 200
+    except SchedulerSaturated as e:
+        return busy_response(e)
     except KeyError as e:
         return jsonify({
             'error': f'Invalid data: missing {str(e)}'
@@ -144,6 +243,84 @@ def predict_vehicle_equity():
             'error': 'An error occurred during the prediction'
         }), 500
     
+# Default what-if grid: 5k to 30k annual miles in 2.5k steps, projected 1 to 10 years ahead.
+DEFAULT_GRID_ANNUAL_MILEAGES = list(range(5000, 30001, 2500))
+DEFAULT_GRID_YEARS = list(range(1, 11))
+# Upper bound on the number of grid points scored per request.
+MAX_GRID_POINTS = 5000
+
+# API endpoint to generate a depreciation surface across annual mileage scenarios and years ahead.
+# This endpoint expects the same vehicle payload as /api/predict, with optional 'annual_mileages' and 'years' lists.
+# The whole grid is scored in a single model call, and the results are returned directly without being stored.
+@prediction_bp.route('/api/predict/grid', methods = ['POST'])
+def predict_vehicle_grid():
+    try:
+        # Perfrom initial check for the model and the request payload.
+        # The model version is taken once, so the whole request uses the same version even if a new one is swapped in.
+        model = model_manager.current()
+        if model is None:
+            return model_unavailable_response()
+        predictor = model.predictor
+
+        data = request.get_json()
+        if not data:
+            return jsonify({
+                'error': 'No data provided for model'
+            }), 400
+
+        annual_mileages = data.get('annual_mileages', DEFAULT_GRID_ANNUAL_MILEAGES)
+        years = data.get('years', DEFAULT_GRID_YEARS)
+
+        # Validate the grid axes before building the feature matrix.
+        if not isinstance(annual_mileages, list) or not annual_mileages or not all(
+            isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0 for value in annual_mileages
+        ):
+            return jsonify({
+                'error': 'annual_mileages must be a non-empty list of non-negative numbers'
+            }), 400
+
+        if not isinstance(years, list) or not years or not all(
+            isinstance(value, int) and not isinstance(value, bool) and value >= 0 for value in years
+        ):
+            return jsonify({
+                'error': 'years must be a non-empty list of non-negative whole numbers'
+            }), 400
+
+        if len(annual_mileages) * len(years) > MAX_GRID_POINTS:
+            return jsonify({
+                'error': f'Grid is limited to {MAX_GRID_POINTS} points'
+            }), 400
+
+        # Score the current value and the full grid in one batch.
+        # Zero years ahead leaves mileage and listing date untouched, so its first row is the current value.
+        values = predictor.predict_grid(data, annual_mileages, [0] + years)
+        current_value = values[0, 0]
+        values = values[:, 1:]
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'current_value': float(current_value),
+                'annual_mileages': annual_mileages,
+                'years': years,
+                # values[i][j] is the value at annual_mileages[i] after years[j] years.
+                'values': values.tolist()
+            }
+        }), 200
+    except SchedulerSaturated as e:
+        return busy_response(e)
+    except KeyError as e:
+        return jsonify({
+            'error': f'Invalid data: missing {str(e)}'
+        }), 400
+    except Exception as e:
+        print(f"Error in grid predict endpoint: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'error': 'An error occurred during the grid prediction'
+        }), 500
+
 # API endpoint to retrieve prediction results by UUID.
 # This endpoint will be used by the frontend to fetch and display results on the results page.
 # Future updates for this is to add a frontend button to allow users to re-fetch results in case they want to review a previously generated prediction.
@@ -0,0 +1,166 @@
+import json
+import os
+import re
+
+# Normalization of raw vehicle fields into the values the model was trained on.
+# All mappings are compiled once at import time: ordered substring rules become a single regex and exact mappings
+# become dictionaries, and the NHTSA fields are small closed vocabularies, so the result for each distinct value is
+# cached and most lookups are a single hash lookup instead of a loop over the rules.
+# Every normalizer can be called on a single value, or applied to a whole pandas Series with .apply_series(),
+# which normalizes each distinct value once and maps the results back onto the column.
+
+# Color mappings built in notebooks/data_exploration.ipynb and used to create the *_color_base training columns.
+COLOR_MAPPINGS_PATH = os.getenv(
+    'COLOR_MAPPINGS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'color_mappings.json')
+)
+
+# Ordered substring rules for the NHTSA 'Body Class' field. The first rule contained in the value wins.
+# NHTSA reports 'Hatchback/Liftback/Notchback' as a single body class, which is covered by the 'hatchback' rule.
+BODY_TYPE_RULES = [
+    ('sedan', 'sedan'),
+    ('coupe', 'coupe'),
+    ('convertible', 'convertible'),
+    ('suv', 'suv / crossover'),
+    ('sport utility vehicle', 'suv / crossover'),
+    ('multipurpose passenger vehicle', 'suv / crossover'),
+    ('pickup', 'pickup truck'),
+    ('truck', 'pickup truck'),
+    ('wagon', 'wagon'),
+    ('hatchback', 'hatchback'),
+    ('liftback', 'hatchback'),
+    ('van', 'van'),
+]
+
+# Ordered substring rules for the NHTSA 'Transmission Style' field, model values are a, m and cvt.
+TRANSMISSION_RULES = [
+    ('cvt', 'cvt'),
+    ('continuously variable', 'cvt'),
+    ('manual', 'm'),
+    ('automatic', 'a'),
+]
+
+# Ordered substring rules for the NHTSA 'Drive Type' field, which reports composite values
+# such as 'FWD/Front-Wheel Drive' or '4WD/4-Wheel Drive/4x4'.
+DRIVE_TYPE_RULES = [
+    ('awd', 'all-wheel drive'),
+    ('all-wheel', 'all-wheel drive'),
+    ('4wd', 'four-wheel drive'),
+    ('4x4', 'four-wheel drive'),
+    ('4-wheel', 'four-wheel drive'),
+    ('four-wheel', 'four-wheel drive'),
+    ('fwd', 'front-wheel drive'),
+    ('front-wheel', 'front-wheel drive'),
+    ('4x2', 'front-wheel drive'),
+    ('rwd', 'rear-wheel drive'),
+    ('rear-wheel', 'rear-wheel drive'),
+]
+
+# Number of distinct values each normalizer keeps results for, well above the size of the NHTSA vocabularies.
+CACHE_SIZE = 1024
+
+class SubstringRules:
+    # Maps a value to the result of the first rule whose term appears anywhere in the lowercased value.
+    def __init__(self, rules, default):
+        self.results = [result for _, result in rules]
+        self.priorities = {term.lower(): i for i, (term, _) in reversed(list(enumerate(rules)))}
+        self.default = default
+        self.cache = {}
+        # One scan of the value finds the terms it contains, and the term with the lowest rule index wins.
+        self.pattern = re.compile('|'.join(re.escape(term.lower()) for term, _ in rules))
+
+    def __call__(self, value):
+        if not isinstance(value, str):
+            return self.default
+
+        result = self.cache.get(value)
+        if result is None:
+            result = self._match(value.strip().lower())
+            if len(self.cache) < CACHE_SIZE:
+                self.cache[value] = result
+        return result
+
+    def _match(self, value):
+        priority = None
+        for match in self.pattern.finditer(value):
+            term_priority = self.priorities[match.group()]
+            if priority is None or term_priority < priority:
+                priority = term_priority
+        if priority is None:
+            return self.default
+        return self.results[priority]
+
+    def apply_series(self, series):
+        return _apply_series(self, series)
+
+class ExactMapping:
+    # Maps a value through a dictionary after stripping and lowercasing it.
+    def __init__(self, mapping, default):
+        self.mapping = {key.strip().lower(): value for key, value in mapping.items()}
+        self.default = default
+
+    def __call__(self, value):
+        if not isinstance(value, str):
+            return self.default
+        return self.mapping.get(value.strip().lower(), self.default)
+
+    def apply_series(self, series):
+        return _apply_series(self, series)
+
+# Normalizes each distinct value of a Series once and maps the results back, missing values get the default.
+def _apply_series(normalizer, series):
+    lookup = {value: normalizer(value) for value in series.dropna().unique()}
+    return series.map(lookup).fillna(normalizer.default)
+
+# Loads the exterior and interior color maps, returning None for each if the file is unavailable.
+def _load_color_mappings(filepath):
+    try:
+        with open(filepath, 'r') as f:
+            color_mappings = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'Color mappings not loaded from {filepath}: {e}')
+        return None, None
+
+    # Colors missing from the maps were set to 'other' when the training data was processed.
+    return (
+        ExactMapping(color_mappings['exterior_color_map'], 'other'),
+        ExactMapping(color_mappings['interior_color_map'], 'other')
+    )
+
+normalize_body_type = SubstringRules(BODY_TYPE_RULES, 'sedan')
+normalize_transmission = SubstringRules(TRANSMISSION_RULES, 'a')
+normalize_drive_type = SubstringRules(DRIVE_TYPE_RULES, 'unknown')
+normalize_exterior_color, normalize_interior_color = _load_color_mappings(COLOR_MAPPINGS_PATH)
+
+# Standardize and map NHTSA fields to 'engine_type' the model expects.
+# The NHTSA API doesn't provide a single field of engine type such as "V6" or "I4",
+# So these fields have to be formatted for what the model expects based on the data it was trained on.
+def normalize_engine_type(cylinders, config):
+    cylinders = (cylinders or '').strip()
+    config = (config or '').strip().lower()
+
+    if cylinders.isdigit():
+        prefix = 'v' if 'v' in config else 'i'
+        return f'{prefix}{int(cylinders)}'
+    elif config:
+        if 'in-line' in config or 'inline' in config:
+            return 'i4'
+        elif 'v' in config:
+            return 'v6'
+        else:
+            return config
+    else:
+        return 'unknown'
+
+# Derives exterior_color_base and interior_color_base from the detailed color columns of a DataFrame.
+# Used by VehiclePredictor.prepare_features() so training data and single-vehicle payloads are canonicalized the same way.
+# Columns are left untouched if the color mappings could not be loaded.
+def normalize_colors(df):
+    for color_col, base_col, normalizer in [
+        ('exterior_color', 'exterior_color_base', normalize_exterior_color),
+        ('interior_color', 'interior_color_base', normalize_interior_color),
+    ]:
+        if normalizer is not None and color_col in df.columns:
+            df[base_col] = normalizer.apply_series(df[color_col])
+
+    return df